@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+import os
+import tempfile
+
+
+# Permissions of new files, mkstemp alone would make them private.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def write(fpath: str, mode: str = "wb", **kwargs):
+    """
+    Opens a file to write fpath with: it's written under a unique temporary name in the same
+    directory, and only replaces fpath once the block finishes. A file that exists is thus
+    always complete, and waves still mapping the old file keep reading it. If the block
+    fails, the temporary file is removed and fpath is left as it was.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(fpath) + ".", suffix=".tmp",
+                               dir=os.path.dirname(fpath) or ".")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+            yield f
+        os.replace(tmp, fpath)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+import multiprocessing
+import os
+import numpy as np
+import cache
+import endpoints
+import wavfile
+
+
+class BatchResult:
+    """
+    Outcome of processing a single file in the batch pipeline.
+    """
+
+    def __init__(self, name: str, path: str, segments: np.ndarray, speech_detected: bool):
+        self.name = name
+        self.path = path
+        self.segments = segments
+        self.speech_detected = speech_detected
+
+
+def pool(workers: int = None) -> ProcessPoolExecutor:
+    """
+    Process pool of the given number of workers, sharing the analysis cache of this process.
+    Workers are started from a fresh server process rather than forked from this one: a fork
+    copies locks held by other threads (like the plot renderer holding the cache's lock)
+    and could deadlock on them.
+    """
+    # Imported here, main imports this module.
+    import main
+
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    store = main.analysis_cache
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=share_cache,
+                               initargs=(os.path.abspath(store.path), store.max_bytes, store.enabled))
+
+
+def share_cache(path: str, max_bytes: int, enabled: bool):
+    """
+    Worker initializer: uses the analysis cache of the process that started the pool.
+    """
+    import main
+
+    main.analysis_cache = cache.Cache(path, max_bytes, enabled)
+
+
+def process(name: str, path: str, p: int, r: int):
+    """
+    Worker: loads the wave and finds its speech segments, through the analysis cache like
+    SoundWave.clean, so a wave that's already been cut isn't even decoded. Only the segments
+    are returned, the parent cuts its own (memory-mapped) copy of the wave with them.
+    """
+    # Imported here, main imports this module.
+    import main
+
+    wav = wavfile.WaveFile(path)
+    sw = main.SoundWave(name, wav, wav.mono())
+    return (name, path, endpoints.segments(*sw.speech_runs(p, r)))
+
+
+def run(
+        files: List[Tuple[str, str]],
+        p: int,
+        r: int,
+        workers: int = None,
+        progress: Callable[[int, int, str], None] = None) -> Tuple[Dict[str, BatchResult], Dict[str, str]]:
+    """
+    Runs load -> find_endpoints over (name, path) pairs on a process pool of the given
+    number of workers. Only the segments come back from the workers, so no samples are
+    pickled. Calls progress(done, total, name) after each file. A failing file doesn't stop
+    the batch. Returns the results and the errors, both keyed by name.
+    """
+    results = {}
+    errors = {}
+    with pool(workers) as executor:
+        futures = {executor.submit(process, name, path, p, r): name for name, path in files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                _, path, segments = future.result()
+                results[name] = BatchResult(name, path, segments, len(segments) > 0)
+            except Exception as e:
+                errors[name] = str(e) or type(e).__name__
+            if progress is not None:
+                progress(done, len(futures), name)
+    return (results, errors)
+
+
+def sweep(name: str, path: str, ps: List[int], rs: List[int]):
+    """
+    Worker: speech segments of the wave for every combination of ps and rs, see endpoints.sweep.
+    """
+    wav = wavfile.WaveFile(path)
+    vals, lengths = endpoints.frame_runs(np.asarray(wav.mono()), wav.getframerate())
+    return (name, endpoints.sweep(vals, lengths, ps, rs))
+
+
+def tune(
+        files: List[Tuple[str, str]],
+        ps: List[int],
+        rs: List[int],
+        workers: int = None,
+        progress: Callable[[int, int, str], None] = None) -> Tuple[Dict[str, list], Dict[str, str]]:
+    """
+    Runs a sweep over (name, path) pairs on a process pool. Returns the segments of each
+    file, indexed [p][r], and the errors, both keyed by name.
+    """
+    results = {}
+    errors = {}
+    with pool(workers) as executor:
+        futures = {executor.submit(sweep, name, path, ps, rs): name for name, path in files}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                results[name] = future.result()[1]
+            except Exception as e:
+                errors[name] = str(e) or type(e).__name__
+            if progress is not None:
+                progress(done, len(futures), name)
+    return (results, errors)
@@ -0,0 +1,269 @@
+"""
+Benchmarks of the hot paths of the program: load_wave, find_endpoints, clean, dft,
+generate_wave and the spectrogram, plus the time to the first prompt. Every function is timed on synthetic signals of several
+lengths and channel counts, and on the real files in ./input, both at their native frame rate
+and resampled to the analysis rate (label@<rate>Hz). Results are compared against
+a JSON baseline and the run fails if any of them got slower (or hungrier) than the
+regression threshold allows. Runs headless.
+
+    python bench.py --update          # record a new baseline
+    python bench.py                   # compare against it
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np
+import main
+import profiling
+import pyramid
+
+
+# Synthetic signal lengths (s) and channel counts.
+LENGTHS = [1, 60, 1800]
+CHANNELS = [1, 2]
+FRAMERATE = 44100
+# Frames written at once while generating synthetic signals.
+CHUNK = 1 << 18
+# Numbers of files in ./input the startup time is measured with, and the most it may take (s).
+STARTUP_FILES = [0, 100, 1000]
+STARTUP_BUDGET = 1.0
+# Analysis frame rate (Hz) the resampled runs load waves at.
+RESAMPLE_RATE = 16000
+# Differences below these are treated as noise and never reported as regressions.
+MIN_TIME_DELTA = 0.005
+MIN_PEAK_DELTA = 1 << 20
+
+
+def synthesize(fpath: str, seconds: int, nchannels: int, seed: int = 0):
+    """
+    Writes a 16-bit test signal: low noise with a one second tone burst every five seconds,
+    so the endpoint detection has speech to find.
+    """
+    rng = np.random.default_rng(seed)
+    n = seconds * FRAMERATE
+    with wave.open(fpath, "wb") as wav:
+        wav.setnchannels(nchannels)
+        wav.setsampwidth(2)
+        wav.setframerate(FRAMERATE)
+        for start in range(0, n, CHUNK):
+            t = np.arange(start, min(n, start + CHUNK))
+            vals = rng.normal(0, 50, len(t))
+            burst = (t // FRAMERATE) % 5 == 2
+            vals[burst] += 8000 * np.sin(2 * np.pi * 220 * t[burst] / FRAMERATE)
+            frames = np.repeat(vals[:, None], nchannels, axis=1)
+            wav.writeframes(frames.astype("<i2").tobytes())
+
+
+def measure(setup, fn, repeat: int):
+    """
+    Runs fn(setup()) repeat times and returns the best wall time (s), then once more under
+    tracemalloc for the peak memory (bytes).
+    """
+    best = None
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    arg = setup()
+    tracemalloc.start()
+    fn(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (best, peak)
+
+
+def startup(nfiles: int, repeat: int) -> float:
+    """
+    Best time (s) for the program to start with nfiles short waves in ./input, show the
+    prompt and quit. Runs main.py in a scratch directory, so the real ./input isn't touched.
+    """
+    scratch = tempfile.mkdtemp(prefix="bench-startup-")
+    try:
+        os.mkdir(os.path.join(scratch, "input"))
+        if nfiles > 0:
+            first = os.path.join(scratch, "input", "w0.wav")
+            synthesize(first, 1, 1)
+            for i in range(1, nfiles):
+                shutil.copyfile(first, os.path.join(scratch, "input", f"w{i}.wav"))
+
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script], cwd=scratch, input="quit\n",
+                           capture_output=True, text=True, check=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def cases(directory: str, names, scratch: str, generate_ms: int = None, rate: int = None):
+    """
+    Benchmark cases over the waves in directory: (function name, setup, function). With a
+    rate, waves are loaded resampled to it.
+    """
+    def loaded():
+        return [main.load_wave(n, directory=directory, rate=rate) for n in names]
+
+    def touched():
+        waves = loaded()
+        for sw in waves:
+            sw.values
+        return waves
+
+    def spectrogram(waves):
+        for i, sw in enumerate(waves):
+            if sw.length >= 1024:
+                pyramid.build(os.path.join(scratch, f"spec{i}"), sw.values,
+                              sw.wave.getframerate(), 1024, 100, "hamming")
+
+    yield ("load_wave", lambda: None, lambda _: [sw.values for sw in loaded()])
+    yield ("find_endpoints", touched, lambda waves: [sw.find_endpoints(main.p, main.r) for sw in waves])
+    yield ("clean", touched, lambda waves: [sw.clean(main.p, main.r) for sw in waves])
+    yield ("dft", touched, lambda waves: [main.dft(sw, 100, "hamming") for sw in waves])
+    yield ("spectrogram", touched, spectrogram)
+    if generate_ms != None:
+        yield ("generate_wave", lambda: None, lambda _: main.generate_wave("bench-generated", 10, generate_ms))
+
+
+def run(lengths, channels, repeat: int, only: str = None, startup_files=STARTUP_FILES,
+        rate: int = RESAMPLE_RATE):
+    """
+    Runs all benchmarks. Returns a dict of "function[signal]" -> {"time", "peak"}.
+    """
+    # The analysis cache would turn every repeat into a cache hit, and stage profiling
+    # would keep tracemalloc running during the timed runs.
+    main.analysis_cache.enabled = False
+    profiling.enabled = False
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="bench-")
+
+    def record(label, directory, names, generate_ms=None):
+        for fn, setup, bench in cases(directory, names, scratch, generate_ms):
+            measured(f"{fn}[{label}]", setup, bench)
+        if rate:
+            for fn, setup, bench in cases(directory, names, scratch, rate=rate):
+                measured(f"{fn}[{label}@{rate}Hz]", setup, bench)
+
+    def measured(k, setup, bench):
+        if only != None and only not in k:
+            return
+        t, peak = measure(setup, bench, repeat)
+        results[k] = {"time": t, "peak": peak}
+        print(f"⏱️  {k:<36} {t * 1000:>10.1f} ms {peak / 2 ** 20:>10.1f} MB")
+        sys.stdout.flush()
+
+    for nfiles in startup_files:
+        k = f"startup[{nfiles}-files]"
+        if only != None and only not in k:
+            continue
+        t = startup(nfiles, repeat)
+        # The child process' memory isn't traced, only its time counts.
+        results[k] = {"time": t, "peak": 0}
+        print(f"⏱️  {k:<36} {t * 1000:>10.1f} ms")
+        sys.stdout.flush()
+
+    try:
+        for seconds in lengths:
+            for nchannels in channels:
+                label = f"{seconds}s-{nchannels}ch"
+                synthesize(os.path.join(scratch, f"{label}.wav"), seconds, nchannels)
+                record(label, scratch, [label], seconds * 1000 if nchannels == 1 else None)
+                os.remove(os.path.join(scratch, f"{label}.wav"))
+
+        names = sorted(f[:-4] for f in os.listdir("./input") if f.endswith(".wav"))
+        if names:
+            record("input", "./input", names)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if os.path.exists("./output/bench-generated.wav"):
+            os.remove("./output/bench-generated.wav")
+    return results
+
+
+def compare(results, baseline, threshold: float, startup_budget: float = STARTUP_BUDGET):
+    """
+    Returns the list of regressions of results against the baseline, and of startups over
+    the budget.
+    """
+    regressions = []
+    for k, res in results.items():
+        if k.startswith("startup[") and res["time"] > startup_budget:
+            regressions.append(f"{k}: {res['time'] * 1000:.1f} ms, over the {startup_budget * 1000:.0f} ms budget")
+        base = baseline.get(k, None)
+        if base == None:
+            continue
+        if res["time"] > base["time"] * (1 + threshold) and res["time"] - base["time"] > MIN_TIME_DELTA:
+            regressions.append(f"{k}: time {base['time'] * 1000:.1f} ms -> {res['time'] * 1000:.1f} ms")
+        if res["peak"] > base["peak"] * (1 + threshold) and res["peak"] - base["peak"] > MIN_PEAK_DELTA:
+            regressions.append(
+                f"{k}: peak memory {base['peak'] / 2 ** 20:.1f} MB -> {res['peak'] / 2 ** 20:.1f} MB")
+    return regressions
+
+
+def main_bench(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the hot paths of the program.")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="baseline JSON file")
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown before failing (default 0.25)")
+    parser.add_argument("--lengths", default=",".join(str(x) for x in LENGTHS),
+                        help="synthetic signal lengths in seconds (default 1,60,1800)")
+    parser.add_argument("--channels", default=",".join(str(x) for x in CHANNELS),
+                        help="synthetic signal channel counts (default 1,2)")
+    parser.add_argument("--startup-files", default=",".join(str(x) for x in STARTUP_FILES),
+                        help="numbers of input files to measure the startup with (default 0,100,1000)")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET,
+                        help="most time the startup may take, in seconds (default 1.0)")
+    parser.add_argument("--rate", type=int, default=RESAMPLE_RATE,
+                        help="analysis frame rate of the resampled runs, 0 to skip them (default 16000)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark, best is kept")
+    parser.add_argument("--only", default=None, help="only run benchmarks containing this text")
+    args = parser.parse_args(argv)
+
+    lengths = [int(x) for x in args.lengths.split(",") if x]
+    channels = [int(x) for x in args.channels.split(",") if x]
+    startup_files = [int(x) for x in args.startup_files.split(",") if x]
+    results = run(lengths, channels, args.repeat, args.only, startup_files, args.rate)
+
+    if args.update:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "results": results}, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    else:
+        print(f"🤔 No baseline at {args.baseline} yet, run with --update to record one.")
+    regressions = compare(results, baseline, args.threshold, args.startup_budget)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s):")
+        for x in regressions:
+            print(f"   {x}")
+        return 1
+    print(f"✅ No regressions above {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_bench())
@@ -0,0 +1,210 @@
+from typing import Callable, Dict, List
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+
+
+# Directory of the persistent analysis cache.
+CACHE_DIR = "./.cache"
+# Size cap of the cache, least recently used entries are evicted above it.
+MAX_BYTES = 512 * 1024 * 1024
+# Bytes read at once while hashing files.
+HASH_CHUNK = 1 << 20
+# Name prefix of the index entries holding the digests of files.
+INDEX_PREFIX = "hash-"
+
+
+def key(*parts) -> str:
+    """
+    Builds a cache key from a content digest and the analysis parameters.
+    """
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def array_digest(values: np.ndarray) -> str:
+    """
+    Content digest of an in-memory array.
+    """
+    values = np.ascontiguousarray(values)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{values.dtype.str}{values.shape}".encode())
+    h.update(values.data)
+    return h.hexdigest()
+
+
+class Cache:
+    """
+    On-disk, content-addressed store of analysis results. Every entry is a .npy (single
+    array) or .npz (several arrays) file named after its key. Reading an entry marks it as
+    recently used; when the total size exceeds max_bytes, the least recently used entries
+    are removed. Safe to use from several threads, like the REPL and the plot renderer.
+    """
+
+    def __init__(self, path: str = CACHE_DIR, max_bytes: int = MAX_BYTES, enabled: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.size = None
+        self.hashes = {}
+        # Guards size and hashes against other threads of this process.
+        self.lock = threading.RLock()
+
+    def array(self, k: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Returns the array stored under key k, computing and storing it on a miss.
+        """
+        if not self.enabled:
+            return compute()
+        fpath = self._entry(k, ".npy")
+        try:
+            os.utime(fpath)
+            return np.load(fpath)
+        except FileNotFoundError:
+            # Not stored yet, or evicted meanwhile by another thread or process.
+            pass
+        values = compute()
+        self._store(fpath, lambda f: np.save(f, values))
+        return values
+
+    def arrays(self, k: str, compute: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """
+        Returns the named arrays stored under key k, computing and storing them on a miss.
+        """
+        if not self.enabled:
+            return compute()
+        fpath = self._entry(k, ".npz")
+        try:
+            os.utime(fpath)
+            with np.load(fpath) as npz:
+                return dict(npz)
+        except FileNotFoundError:
+            pass
+        values = compute()
+        self._store(fpath, lambda f: np.savez(f, **values))
+        return values
+
+    def file_digest(self, fpath: str) -> str:
+        """
+        Content digest of a file. Digests are remembered by path, size and modification time,
+        so unchanged files are only hashed once.
+        """
+        st = os.stat(fpath)
+        apath = os.path.abspath(fpath)
+        with self.lock:
+            known = self.hashes.get(apath, None)
+        # Each file has its own small index entry, shared with other processes (like the
+        # server's workers) without rewriting the digests of all other files.
+        ipath = self._index(apath)
+        if known is None and self.enabled:
+            try:
+                with open(ipath) as f:
+                    known = json.load(f)
+            except (FileNotFoundError, ValueError):
+                pass
+        if known != None and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            with self.lock:
+                self.hashes[apath] = known
+            return known[2]
+
+        h = hashlib.blake2b(digest_size=20)
+        with open(fpath, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+
+        entry = [st.st_size, st.st_mtime_ns, digest]
+        with self.lock:
+            self.hashes[apath] = entry
+        if self.enabled:
+            data = json.dumps(entry).encode()
+            self._store(ipath, lambda f: f.write(data))
+        return digest
+
+    def prefix(self, k: str) -> str:
+        """
+        Path prefix for entries made of several files written outside of the cache, see add.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        return os.path.join(self.path, k)
+
+    def add(self, fpaths: List[str]):
+        """
+        Accounts for files written directly into the cache, evicting old entries if needed.
+        """
+        with self.lock:
+            if self.size is None:
+                self.size = sum(e.stat().st_size for e in os.scandir(self.path))
+            else:
+                self.size += sum(os.path.getsize(x) for x in fpaths)
+            if self.size > self.max_bytes:
+                self._evict(keep=fpaths)
+
+    def touch(self, fpaths: List[str]):
+        """
+        Marks files written directly into the cache as recently used.
+        """
+        for x in fpaths:
+            os.utime(x)
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        with self.lock:
+            if os.path.exists(self.path):
+                for entry in os.scandir(self.path):
+                    os.remove(entry.path)
+            self.size = 0
+            self.hashes = {}
+
+    def _entry(self, k: str, ext: str) -> str:
+        return os.path.join(self.path, k + ext)
+
+    def _index(self, apath: str) -> str:
+        return os.path.join(self.path, INDEX_PREFIX + key(apath) + ".json")
+
+    def _store(self, fpath: str, write: Callable):
+        """
+        Writes an entry atomically, then evicts old entries if the cache grew too large.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # A unique name, so threads and processes storing the same entry don't collide.
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+
+        with self.lock:
+            old = os.path.getsize(fpath) if os.path.exists(fpath) else 0
+            os.replace(tmp, fpath)
+            if self.size is None:
+                self.size = sum(e.stat().st_size for e in os.scandir(self.path))
+            else:
+                self.size += os.path.getsize(fpath) - old
+            if self.size > self.max_bytes:
+                self._evict(keep=[fpath])
+
+    def _evict(self, keep: List[str] = ()):
+        """
+        Removes least recently used entries until the cache fits max_bytes. The files in keep
+        (the entry just written) stay, even if they alone are larger than that; they're the
+        first to go once the next entry comes in.
+        """
+        keep = set(os.path.normpath(x) for x in keep)
+        # Index entries and entries still being written by others are never evicted.
+        entries = [e for e in os.scandir(self.path)
+                   if not e.name.startswith(INDEX_PREFIX) and not e.name.endswith(".tmp")
+                   and os.path.normpath(e.path) not in keep]
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        for e in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+            except FileNotFoundError:
+                # Evicted by another process meanwhile.
+                continue
+            self.size -= size
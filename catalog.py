@@ -0,0 +1,155 @@
+from typing import Dict, Iterable, List, Tuple
+import os
+import re
+import sqlite3
+import wavfile
+
+
+# SQLite database of the catalog.
+CATALOG_PATH = "./.catalog.sqlite"
+
+# Numeric fields that can be queried: query name -> column.
+FIELDS = {"duration": "duration", "rate": "framerate", "channels": "nchannels", "endpoints": "endpoints"}
+# Status words that can be queried: word -> condition.
+STATUSES = {"speech": "speech = 1", "noise": "speech = 0", "unanalysed": "speech IS NULL"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS waves (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    framerate INTEGER NOT NULL,
+    nchannels INTEGER NOT NULL,
+    sampwidth INTEGER NOT NULL,
+    speech INTEGER,
+    endpoints INTEGER,
+    p INTEGER,
+    r INTEGER
+);
+CREATE INDEX IF NOT EXISTS waves_name ON waves (name);
+CREATE INDEX IF NOT EXISTS waves_duration ON waves (duration);
+CREATE INDEX IF NOT EXISTS waves_framerate ON waves (framerate);
+CREATE INDEX IF NOT EXISTS waves_nchannels ON waves (nchannels);
+CREATE INDEX IF NOT EXISTS waves_speech ON waves (speech, endpoints);
+"""
+
+_TERM = re.compile(r"^(\w+)(<=|>=|<|>|=)([\d.]+)(?:-([\d.]+))?$")
+
+
+class Catalog:
+    """
+    Persistent index of .wav files, built from their headers and from analysis results. Files
+    are only (re)read when their size or modification time changed, so keeping the catalog
+    up to date with a directory costs one stat per file. Queries never open any audio.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_SCHEMA)
+
+    def scan(self, directory: str) -> Tuple[int, int, int]:
+        """
+        Brings the catalog up to date with the .wav files in directory. Returns the number of
+        files added, updated and removed.
+        """
+        directory = directory.rstrip("/")
+        known = {row["path"]: (row["size"], row["mtime_ns"]) for row in self.db.execute(
+            "SELECT path, size, mtime_ns FROM waves WHERE path LIKE ? ESCAPE '\\'",
+            (_escape(directory + "/") + "%",))
+            if os.path.dirname(row["path"]) == directory}
+
+        added = updated = 0
+        seen = set()
+        with self.db:
+            for entry in os.scandir(directory):
+                if not entry.name.endswith(".wav"):
+                    continue
+                fpath = f"{directory}/{entry.name}"
+                seen.add(fpath)
+                st = entry.stat()
+                old = known.get(fpath, None)
+                if old == (st.st_size, st.st_mtime_ns):
+                    continue
+                if self._put(fpath, st):
+                    added += old == None
+                    updated += old != None
+
+            removed = [x for x in known if x not in seen]
+            self.db.executemany("DELETE FROM waves WHERE path = ?", [(x,) for x in removed])
+        return (added, updated, len(removed))
+
+    def add(self, fpath: str):
+        """
+        Adds (or updates) a single file, if it changed since it was last cataloged.
+        """
+        st = os.stat(fpath)
+        row = self.db.execute("SELECT size, mtime_ns FROM waves WHERE path = ?", (fpath,)).fetchone()
+        if row != None and (row["size"], row["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return
+        with self.db:
+            self._put(fpath, st)
+
+    def record(self, results: Iterable[Tuple[str, bool, int]], p: int, r: int):
+        """
+        Stores analysis results as (path, speech detected, number of endpoints) tuples.
+        """
+        with self.db:
+            self.db.executemany(
+                "UPDATE waves SET speech = ?, endpoints = ?, p = ?, r = ? WHERE path = ?",
+                [(int(speech), n, p, r, fpath) for fpath, speech, n in results])
+
+    def query(self, terms: List[str]) -> List[Dict]:
+        """
+        Returns the waves matching all terms, by name. A term is a status (speech, noise,
+        unanalysed), a comparison of a field (duration, rate, channels, endpoints) like
+        duration>1.5, rate=44100 or duration=1-2 for a range, or else a part of the name.
+        Raises ValueError for a comparison of an unknown field.
+        """
+        conds, params = [], []
+        for term in terms:
+            m = _TERM.match(term)
+            if term.lower() in STATUSES:
+                conds.append(STATUSES[term.lower()])
+            elif m != None:
+                field, op, a, b = m.groups()
+                if field not in FIELDS:
+                    raise ValueError(f"Unknown field {field}, choose one of {', '.join(FIELDS)}")
+                if b != None:
+                    if op != "=":
+                        raise ValueError(f"A range can only be used with =, like {field}={a}-{b}")
+                    conds.append(f"{FIELDS[field]} BETWEEN ? AND ?")
+                    params += [float(a), float(b)]
+                else:
+                    conds.append(f"{FIELDS[field]} {op} ?")
+                    params.append(float(a))
+            else:
+                conds.append("name LIKE ? ESCAPE '\\'")
+                params.append("%" + _escape(term) + "%")
+
+        where = " WHERE " + " AND ".join(conds) if conds else ""
+        return [dict(row) for row in self.db.execute(
+            f"SELECT * FROM waves{where} ORDER BY name, path", params)]
+
+    def close(self):
+        self.db.close()
+
+    def _put(self, fpath: str, st: os.stat_result) -> bool:
+        try:
+            wav = wavfile.WaveFile(fpath)
+        except ValueError:
+            self.db.execute("DELETE FROM waves WHERE path = ?", (fpath,))
+            return False
+        # A changed file needs to be analysed again.
+        self.db.execute(
+            "INSERT OR REPLACE INTO waves (path, name, size, mtime_ns, duration, framerate, nchannels, sampwidth) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (fpath, os.path.basename(fpath)[:-4], st.st_size, st.st_mtime_ns,
+             wav.getnframes() / wav.getframerate(), wav.getframerate(), wav.getnchannels(), wav.getsampwidth()))
+        return True
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -9,18 +9,32 @@ TEXT_WELCOME = """
                           /___/                        
 
 """
-TEXT_CLEAN = "✂️  cut <filename> [...filenames] ::: Removes non-speech parts of the selected soundwaves."
+TEXT_CLEAN = "✂️  cut [-j <workers>] <filename> [...filenames] ::: Removes non-speech parts of the selected soundwaves. Waves loaded from files are cut in parallel on -j worker processes (all CPU cores by default)."
+TEXT_COMPARE = "🔗 compare [...filenames] ::: Compares the spectral fingerprints of the speech in the selected sound waves (all loaded by default). Prints their distances (0 means the same spectrum), or the most similar pairs for many waves."
+TEXT_MATCH = "🔎 match [-k <count>] <filename> ::: Finds the -k (5 by default) loaded sound waves whose speech sounds most similar to the selected one."
 TEXT_HELP  = "📜 help ::: Shows this menu."
-TEXT_LIST  = "💿 list [like] ::: Lists all loaded wavefiles. Optionally, list all waves with [like] in their name."
-TEXT_LOAD  = "📥 load <filename> [...filenames] ::: Loads each specified file from ./input/<filename>.wav."
-TEXT_PLOT  = "📈 plot [-t <waveform|spectrogram|histogram>] [-w <window beginning timestamp in ms>-<window ending timestamp in ms>] [-f <none|hamming|hanning>] [...filenames] ::: Plots the selected wavefile on the selected type of graph. Multiple wavefiles may be plotted. If no file is specified, plots all loaded. If spectrogram or histogram specified, use -w to specify window length and -f to specify the window function."
+TEXT_LIST  = "💿 list [like...] ::: Lists all known wavefiles. Optionally, only those matching all given terms: a part of the name, a status (speech, noise, unanalysed) or a comparison of duration (s), rate, channels or endpoints, like duration>1.5, rate=44100 or duration=1-2."
+TEXT_LOAD  = "📥 load [-r <rate>] <filename> [...filenames] ::: Loads each specified file from ./input/<filename>.wav. Use -r to resample the waves to a lower frame rate (Hz) for faster analysis; endpoints still map to the samples of the files."
+TEXT_PLOT  = "📈 plot [-t <waveform|spectrogram|histogram>] [-w <window beginning timestamp in ms>-<window ending timestamp in ms>] [-f <none|hamming|hanning>] [-e <png|svg>] [-o] [...filenames] ::: Plots the selected wavefile on the selected type of graph. Multiple wavefiles may be plotted. If no file is specified, plots all loaded. If spectrogram or histogram specified, use -w to specify window length and -f to specify the window function. Use -o to also plot the uncut originals of cut waves. Plots render in the background to ./output/plots (as png, or svg with -e), plotting the same again reuses the file."
+TEXT_STATS = "⏱️  stats [reset|mem <on|off>|trace <file|off>] ::: Shows how long each command and stage took (rolling percentiles) and its memory peak. Memory peaks are only tracked after mem on, tracking slows everything down. Use trace to log every stage to a JSON-lines file."
+TEXT_STREAM = "🌊 stream <filename> [...filenames] ::: Removes non-speech parts of ./input/<filename>.wav chunk by chunk, without loading the whole file, and saves the speech to ./output/<filename>-cut.wav."
+TEXT_TUNE  = "🎛️  tune [-p <values>] [-r <values>] [-j <workers>] [...filenames] ::: Finds speech in the selected sound waves (all loaded by default) for every combination of P and R values, given as a list (100,500,1000) or a range (100-1000:100). Prints for how many waves speech was found and saves the endpoints to ./output/tune.json."
 TEXT_QUIT  = "🚪 quit ::: Closes the application."
-TEXT_GEN   = "🎧 gen [name] [harmonics] [duration] ::: Generates a sound wave with the given name and number of harmonics, lasting [duration] ms. If no name provided, name will be generated. Harmonics number equals 10 by default. Duration equals 100 (ms) by default."
+TEXT_ENDPOINTS = "🔊 endpoints [-c] [...filenames] ::: Prints where speech starts and ends in the selected sound waves (all loaded by default), detected for all of them at once. Use -c to detect speech in every channel of the files separately."
+TEXT_FEATURES = "🧮 features [-m <mel bands>] [-c <coefficients>] [...filenames] ::: Extracts the log-mel spectrogram (40 bands by default) and MFCCs (13 by default) of the speech in the selected sound waves (all loaded by default) and saves them to ./output/features/<filename>.npz, along with the start time of every frame. Cut waves use their speech, others the speech cut would keep."
+TEXT_EXPORT = "📤 export [-j <workers>] [-m <json|csv>] [...filenames] ::: Saves the speech of the selected sound waves (all loaded by default) to ./output/<filename>-cut.wav, in the sample format and frame rate of their files, and the endpoints, durations and speech flags of all of them to ./output/manifest.json (or .csv with -m). Cut waves use their speech, others the speech cut would keep. Files are written on -j threads (all CPU cores by default)."
+TEXT_GEN   = "🎧 gen [name] [harmonics] [duration] [-s seed] [-f int16|int32|float32] ::: Generates a sound wave with the given name and number of harmonics, lasting [duration] ms. If no name provided, name will be generated. Harmonics number equals 10 by default. Duration equals 100 (ms) by default. The same seed always generates the same wave. Samples are 32-bit integers by default."
+TEXT_UNCUT = "🩹 uncut [...filenames] ::: Undoes cut, restoring the original sound waves. If no file is specified, restores all loaded."
 TEXT_NOT_LOADED = "🤔 I couldn't find sound wave \"%s\", did you load it? "
 TEXT_INVALID_SYNTAX = "🤔 I couldn't understand that. Try this command:"
-TEXT_INVALID_SYNTAX_PLOT_WINDOW_T = "🤔 Oops. If you specify -w, you need to enter a number, like so: -w 300."
+TEXT_INVALID_SYNTAX_CUT_WORKERS = "🤔 Oops. If you specify -j, you need to enter a positive number of workers, like so: -j 4."
+TEXT_INVALID_SYNTAX_LOAD_RATE = "🤔 Oops. If you specify -r, you need to enter a frame rate in Hz, like so: -r 16000."
+TEXT_INVALID_SYNTAX_EXPORT = "🤔 Oops. If you specify -j, you need to enter a positive number of workers, and -m can only be json or csv, like so: -j 4 -m csv."
+TEXT_INVALID_SYNTAX_GEN = "🤔 Oops. If you specify -s, you need to enter a whole number as the seed, and -f can only be int16, int32 or float32, like so: -s 42 -f int16."
+TEXT_INVALID_SYNTAX_PLOT_WINDOW_T = "🤔 Oops. If you specify -w, you need to enter a number or a range, like so: -w 300 or -w 200-500."
 TEXT_INVALID_SYNTAX_PLOT_WINDOW = "🤔 Oops, something went wrong. One or more sound waves specified are not available at the specified timestamp."
 TEXT_INVALID_SYNTAX_PLOT_WINDOW_F = "🤔 Oops, %s is not a valid window function. Choose \"none\", \"hamming\" or \"hanning\"."
+TEXT_INVALID_SYNTAX_PLOT_FORMAT = "🤔 Oops, %s is not a valid plot format. Choose \"png\" or \"svg\"."
 TEXT_INVALID_SYNTAX_PLOT_TYPE = "🤔 Oops, %s is not a valid plot type. Choose \"waveform\", \"spectrogram\" or \"histogram\"."
 TEXT_ERROR_WRITING = "❌ There was an error while saving the wave "
 TEXT_GENERATED = "💽 You're officially an artist. Here's your sound wave: "
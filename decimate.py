@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+import numpy as np
+
+
+# Number of decimated waveforms kept in memory.
+CACHE_ENTRIES = 64
+
+_cache = OrderedDict()
+
+
+def minmax(values: np.ndarray, pixels: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces values to the minimum and the maximum of each of pixels equal buckets, in the
+    order they appear in. Drawn as a line, the result looks the same as all of values at
+    that width. Returns the indices of the kept samples and the samples themselves.
+    """
+    n = len(values)
+    if n <= 2 * pixels:
+        return (np.arange(n), np.asarray(values))
+
+    bucket = -(-n // pixels)
+    full = n // bucket
+    body = np.asarray(values[:full * bucket]).reshape(full, bucket)
+    base = np.arange(full) * bucket
+    lo = base + body.argmin(axis=1)
+    hi = base + body.argmax(axis=1)
+
+    if full * bucket < n:
+        tail = np.asarray(values[full * bucket:])
+        lo = np.append(lo, full * bucket + tail.argmin())
+        hi = np.append(hi, full * bucket + tail.argmax())
+
+    idx = np.stack((np.minimum(lo, hi), np.maximum(lo, hi)), axis=1).ravel()
+    return (idx, np.asarray(values[idx]))
+
+
+def pieces(parts: List[Tuple[int, np.ndarray]], pixels: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates a wave given as (offset, view) pieces, sharing the pixels between the pieces
+    by their length. Returns the positions of the kept samples and the samples themselves.
+    """
+    total = sum(len(view) for _, view in parts)
+    xs, ys = [], []
+    for offset, view in parts:
+        idx, y = minmax(view, max(1, round(pixels * len(view) / max(total, 1))))
+        xs.append(offset + idx)
+        ys.append(y)
+    if not xs:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0))
+    return (np.concatenate(xs), np.concatenate(ys))
+
+
+def cached(key, compute: Callable[[], Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the decimated waveform stored under key (which should include the resolution
+    and the visible range), computing it on a miss. Least recently used entries are dropped.
+    """
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    result = compute()
+    _cache[key] = result
+    if len(_cache) > CACHE_ENTRIES:
+        _cache.popitem(last=False)
+    return result
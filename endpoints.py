@@ -0,0 +1,408 @@
+from typing import List, Tuple
+import numpy as np
+import profiling
+
+
+# Duration (ms) of the leading part of the wave used to estimate the noise floor.
+INITIAL_T = 100
+# Window width for noise detection, as a fraction of the frame rate (1/10 s).
+WINDOW_W = 10
+# Most samples the batch functions take the absolute value of at once.
+BATCH_SAMPLES = 1 << 22
+
+
+def noise_limit(values: np.ndarray, framerate: int) -> float:
+    """
+    Estimates the noise limit from the first INITIAL_T ms of the wave.
+    """
+    initial_t = round(framerate * INITIAL_T / 1000)
+    initial_f = np.absolute(values[:initial_t])
+    return np.average(initial_f) + 2 * initial_f.std()
+
+
+def window_width(framerate: int) -> int:
+    """
+    Returns the number of samples in a single noise detection window.
+    """
+    return round(framerate * WINDOW_W / 100)
+
+
+def frame_energies(values: np.ndarray, window_w: int) -> np.ndarray:
+    """
+    Average absolute amplitude of each window_w-long frame. The last frame may be shorter.
+    """
+    full = len(values) // window_w
+    absolute = np.absolute(values)
+    energies = absolute[:full * window_w].reshape(full, window_w).mean(axis=1)
+    if full * window_w < len(values):
+        energies = np.append(energies, absolute[full * window_w:].mean())
+    return energies
+
+
+def run_lengths(flags: np.ndarray, weights: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run-length encodes a 1-D array of flags. Returns the value and the length of each run.
+    If weights are given, the length of a run is the sum of the weights of its elements.
+    """
+    flags = np.asarray(flags)
+    if len(flags) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.diff(flags.astype(np.int8))) + 1
+    starts = np.concatenate(([0], starts))
+    if weights is None:
+        lengths = np.diff(np.append(starts, len(flags)))
+    else:
+        lengths = np.add.reduceat(np.asarray(weights, dtype=np.int64), starts)
+    return flags[starts].astype(bool), lengths
+
+
+def merge_runs(vals: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merges adjacent runs that carry the same value.
+    """
+    if len(vals) == 0:
+        return vals, lengths
+    starts = np.concatenate(([0], np.flatnonzero(vals[1:] != vals[:-1]) + 1))
+    return vals[starts], np.add.reduceat(lengths, starts)
+
+
+def fill_gaps(vals: np.ndarray, lengths: np.ndarray, p: int, r: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Applies the P and R rules on run-length encoded noise mask. First, every silence run
+    followed by speech that is shorter than p - 1 samples becomes speech. Then every speech
+    run followed by silence that is shorter than r - 1 samples becomes silence. A leading run
+    only has to be shorter than p (or r) samples, and runs at the very end of the wave are
+    never changed.
+    """
+    vals = vals.copy()
+    vals[~vals & (_gap_lengths(lengths) < p)] = True
+    vals, lengths = merge_runs(vals, lengths)
+
+    vals[vals & (_gap_lengths(lengths) < r)] = False
+    return merge_runs(vals, lengths)
+
+
+def _gap_lengths(lengths: np.ndarray) -> np.ndarray:
+    """
+    Lengths of runs as counted by the P and R rules. The leading run is counted as is,
+    every other run one sample longer, and the last run is never filled.
+    """
+    gaps = lengths + 1
+    if len(gaps):
+        gaps[0] -= 1
+        gaps[-1] = np.iinfo(gaps.dtype).max
+    return gaps
+
+
+def speech_runs(values: np.ndarray, framerate: int, p: int, r: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run-length encoded noise mask of the wave: value (True for speech) and length of each run.
+    """
+    vals, lengths = frame_runs(values, framerate)
+    with profiling.stage("find_endpoints.hangover"):
+        return fill_gaps(vals, lengths, p, r)
+
+
+def frame_runs(values: np.ndarray, framerate: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run-length encoded noise mask of the wave before the P and R rules are applied. It
+    doesn't depend on P and R, so it can be computed once for any number of them.
+    """
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+
+    with profiling.stage("find_endpoints.frames"):
+        noise_l = noise_limit(values, framerate)
+        window_w = window_width(framerate)
+        energies = frame_energies(values, window_w)
+
+    # Length of each frame in samples, the last one may be shorter.
+    frame_l = np.full(len(energies), window_w, dtype=np.int64)
+    frame_l[-1] = len(values) - window_w * (len(energies) - 1)
+    return run_lengths(energies > noise_l, frame_l)
+
+
+def sweep(vals: np.ndarray, lengths: np.ndarray, ps: List[int], rs: List[int]) -> List[List[np.ndarray]]:
+    """
+    Applies fill_gaps for every combination of ps and rs on the runs of frame_runs. Returns
+    the speech segments (see segments) of each combination, indexed [p][r]. The P rule is
+    applied once per p, the R rule for all rs at once: it only ever turns whole speech runs
+    into silence, so it comes down to a single comparison of the run lengths with every r.
+    """
+    out = []
+    rs = np.asarray(rs, dtype=np.int64)
+    for p in ps:
+        v = vals.copy()
+        v[~v & (_gap_lengths(lengths) < p)] = True
+        v, l = merge_runs(v, lengths)
+
+        stops = np.cumsum(l)
+        starts = stops - l
+        keep = v[None, :] & ~(_gap_lengths(l)[None, :] < rs[:, None])
+        out.append([np.stack((starts[k], stops[k]), axis=1) for k in keep])
+    return out
+
+
+def pad(rows: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stacks 1-D arrays of any lengths into a zero-padded 2-D batch for the batch functions.
+    Returns the batch and the length of each row.
+    """
+    lengths = np.array([len(x) for x in rows], dtype=np.int64)
+    dtype = np.result_type(*rows) if len(rows) else np.float64
+    batch = np.zeros((len(rows), lengths.max(initial=0)), dtype=dtype)
+    for i, x in enumerate(rows):
+        batch[i, :len(x)] = x
+    return batch, lengths
+
+
+def batch_frame_runs(values: np.ndarray, lengths=None, framerates=44100) -> Tuple[np.ndarray, ...]:
+    """
+    frame_runs of every row of a padded 2-D batch (waves or channels by samples), with the
+    given length (all of the row by default) and frame rate per row. Returns the runs of
+    all rows one after another, as value, length and row of each run.
+    """
+    n = len(values)
+    lengths = np.broadcast_to(np.asarray(values.shape[1] if lengths is None else lengths, dtype=np.int64), n)
+    framerates = np.broadcast_to(np.asarray(framerates), n)
+    flags, frame_l, rows = [], [], []
+
+    with profiling.stage("batch_endpoints.frames"):
+        # Rows of the same frame rate share the frame width, their frames are averaged at once.
+        for fr in np.unique(framerates):
+            group = np.flatnonzero((framerates == fr) & (lengths > 0))
+            if len(group) == 0:
+                continue
+            # Longest rows first, so the rows that still have frames left are always the first ones.
+            group = group[np.argsort(-lengths[group], kind="stable")]
+            window_w = window_width(int(fr))
+            noise_l = _noise_limits(values, group, lengths[group], int(fr))
+
+            full = lengths[group] // window_w
+            rem = lengths[group] - full * window_w
+            energies = np.empty((len(group), full[0] + 1))
+            # Blocks of frames of the rows that reach them, so padding is (mostly) skipped and
+            # the absolute values of only BATCH_SAMPLES samples are held at once.
+            j = 0
+            while j < full[0]:
+                m = np.count_nonzero(full > j)
+                k = min(full[0] - j, max(1, BATCH_SAMPLES // (m * window_w)))
+                block = np.absolute(values[group[:m], j * window_w:(j + k) * window_w])
+                energies[:m, j:j + k] = block.reshape(m, k, window_w).mean(axis=2)
+                j += k
+            # The shorter last frame of each row, wherever it ends. Integer samples add up
+            # exactly in any order, so those are averaged at once; floats one row at a time.
+            tails = np.flatnonzero(rem)
+            if np.issubdtype(values.dtype, np.integer) and len(tails):
+                starts = np.cumsum(rem[tails]) - rem[tails]
+                cols = np.arange(starts[-1] + rem[tails[-1]]) - np.repeat(starts - full[tails] * window_w, rem[tails])
+                block = np.absolute(values[np.repeat(group[tails], rem[tails]), cols]).astype(np.float64)
+                energies[tails, full[tails]] = np.add.reduceat(block, starts) / rem[tails]
+            else:
+                for k in tails:
+                    energies[k, full[k]] = np.absolute(values[group[k], full[k] * window_w:lengths[group[k]]]).mean()
+
+            nframes = full + (rem > 0)
+            valid = np.arange(energies.shape[1])[None, :] < nframes[:, None]
+            flags.append((energies > noise_l[:, None])[valid])
+            fl = np.full(valid.shape, window_w, dtype=np.int64)
+            fl[np.arange(len(group)), nframes - 1] = lengths[group] - window_w * (nframes - 1)
+            frame_l.append(fl[valid])
+            rows.append(np.repeat(group, nframes))
+
+    if len(rows) == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    rows = np.concatenate(rows)
+    order = np.argsort(rows, kind="stable")
+    return _runs(np.concatenate(flags)[order], np.concatenate(frame_l)[order], rows[order])
+
+
+def batch_fill_gaps(vals: np.ndarray, lengths: np.ndarray, rows: np.ndarray, p: int, r: int) -> Tuple[np.ndarray, ...]:
+    """
+    fill_gaps on the runs of many rows at once, see batch_frame_runs. Runs of different rows
+    never merge, and every row has its own leading and last run.
+    """
+    vals = vals.copy()
+    vals[~vals & (_batch_gap_lengths(lengths, rows) < p)] = True
+    vals, lengths, rows = _runs(vals, lengths, rows)
+
+    vals[vals & (_batch_gap_lengths(lengths, rows) < r)] = False
+    return _runs(vals, lengths, rows)
+
+
+def batch_speech_runs(values: np.ndarray, lengths=None, framerates=44100, p: int = 500,
+                      r: int = 5000) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    speech_runs of every row of a padded 2-D batch, see batch_frame_runs. Returns the runs
+    of each row, the same as speech_runs gives for that row alone.
+    """
+    vals, lens, rows = batch_frame_runs(values, lengths, framerates)
+    with profiling.stage("batch_endpoints.hangover"):
+        vals, lens, rows = batch_fill_gaps(vals, lens, rows, p, r)
+    cuts = np.cumsum(np.bincount(rows, minlength=len(values)))[:-1]
+    return list(zip(np.split(vals, cuts), np.split(lens, cuts)))
+
+
+def batch_segments(values: np.ndarray, lengths=None, framerates=44100, p: int = 500,
+                   r: int = 5000) -> List[np.ndarray]:
+    """
+    Speech segments (see segments) of every row of a padded 2-D batch.
+    """
+    return [segments(v, l) for v, l in batch_speech_runs(values, lengths, framerates, p, r)]
+
+
+def batch_borders(values: np.ndarray, lengths=None, framerates=44100, p: int = 500,
+                  r: int = 5000) -> List[List[float]]:
+    """
+    Endpoints of speech (see borders) of every row of a padded 2-D batch.
+    """
+    framerates = np.broadcast_to(np.asarray(framerates), len(values))
+    return [borders(segs, int(fr)) for segs, fr in
+            zip(batch_segments(values, lengths, framerates, p, r), framerates)]
+
+
+def _noise_limits(values: np.ndarray, group: np.ndarray, lengths: np.ndarray, framerate: int) -> np.ndarray:
+    """
+    noise_limit of each row in group. Rows whose leading part is just as long are reduced
+    together, which gives exactly the same result as one row at a time.
+    """
+    initial = np.minimum(lengths, round(framerate * INITIAL_T / 1000))
+    out = np.empty(len(group))
+    for n in np.unique(initial):
+        k = np.flatnonzero(initial == n)
+        initial_f = np.absolute(values[group[k], :n])
+        out[k] = initial_f.mean(axis=1) + 2 * initial_f.std(axis=1)
+    return out
+
+
+def _runs(flags: np.ndarray, weights: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    run_lengths (or merge_runs) over the elements of many rows, never joining two rows.
+    """
+    if len(flags) == 0:
+        return flags.astype(bool), weights.astype(np.int64), rows
+    starts = np.flatnonzero((flags[1:] != flags[:-1]) | (rows[1:] != rows[:-1])) + 1
+    starts = np.concatenate(([0], starts))
+    return flags[starts].astype(bool), np.add.reduceat(weights.astype(np.int64), starts), rows[starts]
+
+
+def _batch_gap_lengths(lengths: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    _gap_lengths of the runs of every row.
+    """
+    gaps = lengths + 1
+    if len(gaps):
+        first = np.concatenate(([True], rows[1:] != rows[:-1]))
+        last = np.concatenate((rows[1:] != rows[:-1], [True]))
+        gaps[first] -= 1
+        gaps[last] = np.iinfo(gaps.dtype).max
+    return gaps
+
+
+def segments(vals: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Converts runs into an (n, 2) array of [start, stop) sample positions of speech.
+    """
+    stops = np.cumsum(lengths)
+    starts = stops - lengths
+    return np.stack((starts[vals], stops[vals]), axis=1)
+
+
+def borders(segs: np.ndarray, framerate: int) -> List[float]:
+    """
+    Timestamps (s) of the first and the last sample of each speech segment.
+    """
+    firsts = segs[:, 0]
+    lasts = segs[:, 1] - 1
+    idx = np.stack((firsts, lasts), axis=1).ravel()
+    # A single-sample segment has only one border.
+    idx = idx[np.concatenate(([True], np.diff(idx) > 0))] if len(idx) else idx
+    return (idx / framerate).tolist()
+
+
+def from_runs(vals: np.ndarray, lengths: np.ndarray, framerate: int) -> Tuple[np.ndarray, List[float]]:
+    """
+    Expands run-length encoded noise mask into the noise mask and borders of
+    SoundWave.find_endpoints.
+    """
+    noise_mask = np.repeat(vals, lengths).astype(np.float64)
+    return (noise_mask, borders(segments(vals, lengths), framerate))
+
+
+class HangoverFilter:
+    """
+    Incremental version of fill_gaps. Runs are pushed as they are detected and the filter
+    returns the runs whose final value is already known. At most p + r samples are held
+    back, so the filter can be used on streams of any length.
+    """
+
+    def __init__(self, p: int, r: int):
+        self.stages = [_HangoverStage(False, p), _HangoverStage(True, r)]
+
+    def push(self, val: bool, length: int) -> List[Tuple[bool, int]]:
+        """
+        Pushes a single run. Returns the runs (value, length) which are now final.
+        """
+        out = [(val, length)]
+        for stage in self.stages:
+            out = [x for v, l in out for x in stage.push(v, l)]
+        return out
+
+    def finish(self) -> List[Tuple[bool, int]]:
+        """
+        Flushes the remaining runs at the end of the stream.
+        """
+        out = []
+        for stage in self.stages:
+            out = [x for v, l in out for x in stage.push(v, l)] + stage.finish()
+        return out
+
+    @property
+    def held(self) -> int:
+        """
+        Number of samples currently held back by the filter.
+        """
+        return sum(stage.held for stage in self.stages)
+
+
+class _HangoverStage:
+    """
+    A single rule of fill_gaps: runs of target value shorter than limit get flipped when
+    followed by a run of the opposite value.
+    """
+
+    def __init__(self, target: bool, limit: int):
+        self.target = target
+        self.limit = limit
+        self.first = True
+        self.val = None
+        self.length = 0
+        self.held = 0
+
+    def push(self, val: bool, length: int) -> List[Tuple[bool, int]]:
+        if length <= 0:
+            return []
+        out = []
+        if self.val is not None and val != self.val:
+            # The held run is followed by the opposite value, so now it's final.
+            if self.held > 0:
+                flip = self.val == self.target and self._gap() < self.limit
+                out.append((val if flip else self.val, self.held))
+            self.first = False
+            self.length = 0
+            self.held = 0
+        self.val = val
+        self.length += length
+        self.held += length
+        if self.val != self.target or self._gap() >= self.limit:
+            out.append((self.val, self.held))
+            self.held = 0
+        return out
+
+    def finish(self) -> List[Tuple[bool, int]]:
+        out = [(self.val, self.held)] if self.held > 0 else []
+        self.held = 0
+        return out
+
+    def _gap(self) -> int:
+        return self.length if self.first else self.length + 1
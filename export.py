@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+import csv
+import json
+import numpy as np
+import atomic
+import profiling
+import wavfile
+
+
+# Directory the speech and the manifest are exported to.
+EXPORT_DIR = "./output"
+# Frames converted at once, for samples that can't be written straight from their buffer.
+CHUNK_FRAMES = 1 << 18
+# Manifest formats.
+FORMATS = ["json", "csv"]
+# Columns of the manifest, in order.
+COLUMNS = ["name", "source", "output", "framerate", "duration", "speech_duration",
+           "speech_detected", "segments", "borders"]
+
+
+def sample_format(dtype: np.dtype) -> Tuple[int, int]:
+    """
+    Sample width and format of a .wav that holds samples of the given type exactly, for
+    waves that don't come from a file: 16-bit or 32-bit PCM, or 32-bit floats.
+    """
+    if np.issubdtype(dtype, np.floating):
+        return (4, wavfile.WAVE_FORMAT_IEEE_FLOAT)
+    return (2 if np.dtype(dtype).itemsize <= 2 else 4, wavfile.WAVE_FORMAT_PCM)
+
+
+def write(fpath: str, source, segments: np.ndarray, framerate: int, sampwidth: int,
+          format: int = wavfile.WAVE_FORMAT_PCM) -> int:
+    """
+    Writes samples [start, stop) of source for every segment, one after another, to a mono
+    .wav at fpath. Source can be an array or a lazy source, like a Channel of a WaveFile.
+    Samples already stored the way the file holds them (16-bit, 32-bit or float samples of
+    a memory-mapped file or an array) are written straight from their buffer, all others
+    are converted CHUNK_FRAMES at a time. Returns the number of frames written.
+    """
+    if format == wavfile.WAVE_FORMAT_PCM:
+        raw = {2: np.dtype("<i2"), 4: np.dtype("<i4")}.get(sampwidth, None)
+    else:
+        raw = np.dtype(f"<f{sampwidth}")
+    nframes = int((segments[:, 1] - segments[:, 0]).sum()) if len(segments) else 0
+
+    with atomic.write(fpath) as f:
+        wavfile.write_header(f, nframes, 1, framerate, sampwidth, format)
+        for start, stop in segments:
+            for i in range(int(start), int(stop), CHUNK_FRAMES):
+                x = source[i:min(int(stop), i + CHUNK_FRAMES)]
+                if x.dtype == raw and x.flags.c_contiguous:
+                    f.write(memoryview(x).cast("B"))
+                elif raw is not None:
+                    f.write(x.astype(raw).tobytes())
+                else:
+                    f.write(wavfile.encode(x, sampwidth))
+    return nframes
+
+
+def write_all(
+        jobs: List[tuple],
+        workers: int = None,
+        progress: Callable[[int, int, str], None] = None) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    Runs write over (name, *args) jobs on a pool of threads. Writing mostly waits on the
+    disk and copies buffers without the GIL, so threads keep the disks busy. Calls
+    progress(done, total, name) after each file. A failing file doesn't stop the others.
+    Returns the frames written and the errors, both keyed by name.
+    """
+    written = {}
+    errors = {}
+    with profiling.stage("export.write"), \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+        futures = {pool.submit(write, *args): name for name, *args in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            try:
+                written[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e) or type(e).__name__
+            if progress is not None:
+                progress(done, len(futures), name)
+    return (written, errors)
+
+
+def write_manifest(fpath: str, rows: List[dict]):
+    """
+    Writes the rows (see COLUMNS) to a .json file as a list, or to a .csv file with one row
+    per wave. In CSV, segments are written as start:stop pairs and borders as timestamps,
+    both separated by spaces.
+    """
+    with atomic.write(fpath, "w", newline="") as f:
+        if fpath.endswith(".json"):
+            json.dump(rows, f, indent=1)
+        else:
+            out = csv.DictWriter(f, COLUMNS)
+            out.writeheader()
+            for row in rows:
+                out.writerow({**row,
+                              "segments": " ".join(f"{a}:{b}" for a, b in row["segments"]),
+                              "borders": " ".join(str(t) for t in row["borders"])})
@@ -0,0 +1,125 @@
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+import stft
+
+
+# Length and hop (ms) of the analysis frames.
+FRAME_T = 25
+HOP_T = 10
+# Window function of the analysis frames.
+WINDOW = "hamming"
+# Number of mel bands and of cepstral coefficients kept.
+N_MELS = 40
+N_MFCC = 13
+# Lowest frequency (Hz) of the mel bands, the highest is half the frame rate.
+F_MIN = 20
+# Floor of the mel energies before the log, so silence doesn't give -inf.
+LOG_FLOOR = 1e-10
+# Number of frames transformed (and multiplied) at once, bounds the memory of a block.
+BLOCK_FRAMES = 4096
+
+
+def frame_sizes(framerate: int) -> Tuple[int, int, int]:
+    """
+    Frame length, hop and FFT size (the next power of two) in samples at the given rate.
+    """
+    N = int(framerate * FRAME_T / 1000)
+    hop = int(framerate * HOP_T / 1000)
+    return (N, hop, 1 << (N - 1).bit_length())
+
+
+def hz_to_mel(f):
+    """
+    Frequency (Hz) on the (HTK) mel scale.
+    """
+    return 2595 * np.log10(1 + np.asarray(f) / 700)
+
+
+def mel_to_hz(m):
+    """
+    Inverse of hz_to_mel.
+    """
+    return 700 * (10 ** (np.asarray(m) / 2595) - 1)
+
+
+@lru_cache(maxsize=32)
+def mel_filterbank(framerate: int, n_fft: int, n_mels: int = N_MELS) -> np.ndarray:
+    """
+    (n_mels, n_fft // 2 + 1) matrix of triangular filters, evenly spaced on the mel scale,
+    that turns a power spectrum into mel band energies. Cached per (rate, n_fft, n_mels).
+    """
+    freqs = framerate * np.arange(n_fft // 2 + 1) / n_fft
+    edges = mel_to_hz(np.linspace(hz_to_mel(F_MIN), hz_to_mel(framerate / 2), n_mels + 2))
+    lo, mid, hi = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    fb = np.maximum(0, np.minimum((freqs - lo) / (mid - lo), (hi - freqs) / (hi - mid)))
+    fb.flags.writeable = False
+    return fb
+
+
+@lru_cache(maxsize=32)
+def dct_matrix(n_mels: int = N_MELS, n_mfcc: int = N_MFCC) -> np.ndarray:
+    """
+    (n_mfcc, n_mels) orthonormal DCT-II matrix, the first n_mfcc cepstral coefficients of
+    log mel energies. Cached per (n_mels, n_mfcc).
+    """
+    k = np.arange(n_mfcc)[:, None]
+    n = np.arange(n_mels)[None, :]
+    m = np.sqrt(2 / n_mels) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels))
+    m[0] /= np.sqrt(2)
+    m.flags.writeable = False
+    return m
+
+
+def extract(waves: List[Tuple[List[np.ndarray], int]], n_mels: int = N_MELS,
+            n_mfcc: int = N_MFCC) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Log-mel spectrogram and MFCCs of many waves, each given as pieces (like its speech
+    segments) and its frame rate. Frames never span two pieces. The frames of all waves of
+    the same rate are transformed together, in blocks, with one FFT and one matrix product
+    per block. Returns (log_mel, mfcc) per wave, of shapes (frames, n_mels), (frames, n_mfcc).
+    """
+    out = [None] * len(waves)
+    rates = np.array([fr for _, fr in waves])
+    for framerate in np.unique(rates):
+        idx = np.flatnonzero(rates == framerate)
+        N, hop, n_fft = frame_sizes(int(framerate))
+        fb = mel_filterbank(int(framerate), n_fft, n_mels)
+        dct = dct_matrix(n_mels, n_mfcc)
+        w = stft.window(N, WINDOW)
+
+        # Strided views of the frames of every piece, nothing is copied yet.
+        views = [[stft.frames(x, N, hop) for x in waves[i][0] if len(x) > 0] for i in idx]
+        counts = [sum(len(v) for v in vs) for vs in views]
+        log_mel = np.empty((sum(counts), n_mels))
+
+        pos = 0
+        for fr in _blocks([v for vs in views for v in vs]):
+            power = np.abs(np.fft.rfft(fr * w, n=n_fft, axis=1)) ** 2
+            log_mel[pos:pos + len(fr)] = np.log(np.maximum(power @ fb.T, LOG_FLOOR))
+            pos += len(fr)
+        mfcc = log_mel @ dct.T
+
+        offsets = np.cumsum([0] + counts)
+        for k, i in enumerate(idx):
+            out[i] = (log_mel[offsets[k]:offsets[k + 1]], mfcc[offsets[k]:offsets[k + 1]])
+    return out
+
+
+def _blocks(views: List[np.ndarray]):
+    """
+    Yields the frames of all views in order, as arrays of at most BLOCK_FRAMES frames.
+    """
+    block, size = [], 0
+    for view in views:
+        i = 0
+        while i < len(view):
+            part = view[i:i + BLOCK_FRAMES - size]
+            block.append(part)
+            size += len(part)
+            i += len(part)
+            if size == BLOCK_FRAMES:
+                yield np.concatenate(block)
+                block, size = [], 0
+    if block:
+        yield np.concatenate(block)
@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+import stft
+
+
+# Number of log-spaced frequency bands of a fingerprint.
+BANDS = 64
+# Frequency range (Hz) covered by the bands.
+F_MIN = 50
+F_MAX = 8000
+# Length (ms) of the frames the spectrum is averaged over.
+FRAME_T = 32
+
+
+@lru_cache(maxsize=32)
+def band_matrix(framerate: int, N: int) -> np.ndarray:
+    """
+    (BANDS, N // 2) matrix averaging the bins of an N-point magnitude spectrum into log-spaced
+    bands. A band narrower than a bin interpolates the two bins around its center instead,
+    so waves of any frame rate get comparable fingerprints.
+    """
+    freqs = framerate * np.arange(N // 2) / N
+    edges = np.geomspace(F_MIN, min(F_MAX, framerate / 2), BANDS + 1)
+    m = np.zeros((BANDS, N // 2))
+    for b in range(BANDS):
+        inside = (freqs >= edges[b]) & (freqs < edges[b + 1])
+        if inside.any():
+            m[b, inside] = 1 / inside.sum()
+        else:
+            center = np.sqrt(edges[b] * edges[b + 1])
+            k = min(int(center * N / framerate), N // 2 - 2)
+            frac = center * N / framerate - k
+            m[b, k], m[b, k + 1] = 1 - frac, frac
+    m.flags.writeable = False
+    return m
+
+
+def fingerprint(pieces: List[np.ndarray], framerate: int) -> np.ndarray:
+    """
+    Fixed-length fingerprint of a wave given as pieces (like its speech segments): the log
+    energy of each band of the average spectrum, without the mean, scaled to unit length.
+    Loudness doesn't change the fingerprint, so the dot product of two fingerprints is their
+    cosine similarity.
+    """
+    N = int(framerate * FRAME_T / 1000)
+    total = np.zeros(N // 2)
+    frames = 0
+    for view in pieces:
+        n = max(1, len(view) // N)
+        total += stft.average(view, N, "hanning") * n
+        frames += n
+    bands = band_matrix(framerate, N) @ (total / max(frames, 1))
+    fp = np.log10(bands + 1e-9)
+    fp -= fp.mean()
+    norm = np.linalg.norm(fp)
+    return (fp / norm if norm > 0 else fp).astype(np.float32)
+
+
+class Index:
+    """
+    Fingerprints of many waves as the rows of one matrix, so all distances to a wave (or
+    between all pairs) are a single matrix product. Distances are cosine distances, 0 for
+    identical spectra and up to 2 for opposite ones.
+    """
+
+    def __init__(self, names: List[str], fingerprints: np.ndarray):
+        self.names = list(names)
+        self.matrix = np.asarray(fingerprints, dtype=np.float32).reshape(len(self.names), BANDS)
+        self.rows = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def distances(self, names: List[str] = None) -> np.ndarray:
+        """
+        Matrix of distances between all pairs of the given waves (all by default).
+        """
+        m = self.matrix if names is None else self.matrix[[self.rows[x] for x in names]]
+        return np.clip(1 - m @ m.T, 0, 2)
+
+    def knn(self, fp: np.ndarray, k: int, exclude: str = None) -> List[Tuple[str, float]]:
+        """
+        The k waves closest to fingerprint fp, nearest first, as (name, distance) pairs.
+        """
+        d = np.clip(1 - self.matrix @ fp, 0, 2)
+        if exclude in self.rows:
+            d[self.rows[exclude]] = np.inf
+        k = min(k, len(d) - (exclude in self.rows))
+        if k <= 0:
+            return []
+        idx = np.argpartition(d, k - 1)[:k]
+        idx = idx[np.argsort(d[idx])]
+        return [(self.names[i], float(d[i])) for i in idx]
+
+    def closest_pairs(self, k: int) -> List[Tuple[str, str, float]]:
+        """
+        The k most similar distinct pairs of waves, as (name, name, distance).
+        """
+        n = len(self.names)
+        if n < 2:
+            return []
+        d = self.distances()
+        i, j = np.triu_indices(n, 1)
+        d = d[i, j]
+        k = min(k, len(d))
+        top = np.argpartition(d, k - 1)[:k]
+        top = top[np.argsort(d[top])]
+        return [(self.names[i[x]], self.names[j[x]], float(d[x])) for x in top]
@@ -1,14 +1,32 @@
+import copy
 import random
-from tkinter.tix import TEXT
 from typing import Dict, List
 import wave
 import numpy as np
 import sys
-import matplotlib.pyplot as plt
+import tempfile
 import os
-import regex as re
+import json
+import mmap
+import re
 from constants import *
-from scipy import signal
+import batch
+import cache
+import catalog
+import decimate
+import endpoints
+import export
+import features
+import fingerprint
+import profiling
+import pyramid
+import registry
+import render
+import resample
+import stft
+import stream
+import synth
+import wavfile
 
 
 # P and R parameters for cleaning.
@@ -16,6 +34,25 @@ p = 500
 r = 5000
 # Whether to auto-load all .wavs from ./input/*
 auto_load = True
+# Whether plots open in a window, blocking until it's closed, instead of being rendered to files.
+show_plots = False
+# Format plots are rendered to, png or svg.
+plot_format = "png"
+# Maximum number of spectrogram columns drawn at once.
+SPECTROGRAM_COLS = 2000
+# Frame rate (Hz) waves are resampled to on load for analysis. None keeps the native rate.
+analysis_rate = None
+# Memory budget (bytes) for the decoded samples of all loaded waves.
+memory_budget = registry.MEMORY_BUDGET
+# Default grid of P and R values tried by tune.
+TUNE_P = [100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000]
+TUNE_R = [1000, 2000, 3000, 4000, 5000, 6000, 8000, 10000, 15000, 20000]
+# Most samples (of all waves together) endpoints detects speech in at once.
+BATCH_SAMPLES = 1 << 26
+# Most waves compare prints a full distance table for, above it only the closest pairs.
+COMPARE_TABLE = 8
+# Number of worker processes for cut. 1 disables the process pool.
+workers = os.cpu_count() or 1
 
 
 class SoundWave:
@@ -33,10 +70,190 @@ class SoundWave:
         self.cleaned = False
         self.speech_detected = False
 
+    @property
+    def source(self) -> np.ndarray:
+        """
+        Original samples of the wave, before any cut. Lazy sources (like a stereo downmix) are
+        only computed on first access, and stored in the smallest type that holds them.
+        """
+        if not isinstance(self._source, np.ndarray):
+            with profiling.stage("load_wave.decode"):
+                self._source = np.asarray(self._source)
+            # Compacted before the registry counts its bytes against the budget.
+            self.compact()
+            sound_waves.decoded(self)
+        return self._source
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Samples of the wave. For a cut wave, the speech segments are joined on first access.
+        """
+        if self.segments is None:
+            return self.source
+        if self._cut is None:
+            self._cut = np.concatenate(self.views()) if len(self.segments) > 0 \
+                else self.source[:0]
+            sound_waves.decoded(self)
+        return self._cut
+
+    @values.setter
+    def values(self, values):
+        self._source = values
+        # Lazy sources (memory-mapped or decoded on demand) can always be restored on release.
+        self._lazy = values if not isinstance(values, np.ndarray) or resident(values) == 0 else None
+        self._source_digest = None
+        self.segments = None
+        self._cut = None
+        self._digest = None
+
+    @property
+    def length(self) -> int:
+        """
+        Number of samples in the wave, without joining the segments of a cut wave.
+        """
+        if self.segments is None:
+            return len(self._source)
+        return int((self.segments[:, 1] - self.segments[:, 0]).sum())
+
+    def nbytes(self) -> int:
+        """
+        Bytes of samples the wave holds in memory. Memory-mapped samples don't count, the
+        OS can drop those pages at any time.
+        """
+        return sum(resident(x) for x in [self._source, self._cut] if isinstance(x, np.ndarray))
+
+    def release(self) -> int:
+        """
+        Drops the samples held in memory that can be recomputed: joined segments of a cut
+        wave and decoded samples of a file. Returns the number of bytes freed.
+        """
+        before = self.nbytes()
+        self._cut = None
+        if self._lazy is not None:
+            self._source = self._lazy
+        return before - self.nbytes()
+
+    def compact(self):
+        """
+        Stores in-memory samples in the smallest type that holds them exactly.
+        """
+        if isinstance(self._source, np.ndarray) and resident(self._source) > 0:
+            values = registry.compact(self._source)
+            if values is not self._source:
+                self._source = values
+                self._source_digest = None
+                self._digest = None
+
+    def views(self) -> List[np.ndarray]:
+        """
+        The wave as a list of read-only views over the original samples: one per speech
+        segment for a cut wave, otherwise a single view of the whole wave.
+        """
+        source = self.source.view()
+        source.flags.writeable = False
+        if self.segments is None:
+            return [source]
+        return [source[start:stop] for start, stop in self.segments]
+
+    def window(self, start: int, stop: int) -> np.ndarray:
+        """
+        Samples [start, stop) of the wave. Only this part of the wave is read: lazy sources
+        aren't computed in full and the segments of a cut wave aren't joined.
+        """
+        parts = [view for _, view in self.pieces(start, stop)]
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else self.source[:0]
+
+    def pieces(self, start: int, stop: int) -> List[tuple]:
+        """
+        Samples [start, stop) of the wave as (offset, samples) pairs, one per speech segment
+        of a cut wave. Offsets are positions in the (cut) wave, samples are views of the
+        original buffer wherever it's already in memory.
+        """
+        if self.segments is None:
+            return [(start, np.asarray(self._source[start:stop]))]
+
+        lengths = self.segments[:, 1] - self.segments[:, 0]
+        cut_stops = np.cumsum(lengths)
+        cut_starts = cut_stops - lengths
+        lo = np.maximum(cut_starts, start)
+        hi = np.minimum(cut_stops, stop)
+        hit = lo < hi
+        src = self.segments[:, 0] - cut_starts
+        return [(int(a), np.asarray(self._source[a + d:b + d]))
+                for a, b, d in zip(lo[hit], hi[hit], src[hit])]
+
+    def digest(self) -> str:
+        """
+        Content digest of the wave, used to key the analysis cache. Waves read from a file are
+        identified by the file contents, all others by their values. Cut waves also include
+        their segments.
+        """
+        if self._source_digest is None:
+            if isinstance(self.wave, wavfile.WaveFile):
+                self._source_digest = cache.key(
+                    analysis_cache.file_digest(self.wave.path), len(np.shape(self._source)))
+            elif isinstance(self.wave, resample.ResampledWave):
+                self._source_digest = cache.key(
+                    analysis_cache.file_digest(self.wave.original.path), len(np.shape(self._source)),
+                    "resampled", self.wave.framerate, resample.HALF_TAPS, resample.WINDOW)
+            else:
+                self._source_digest = cache.array_digest(self.source)
+        if self._digest is None:
+            if self.segments is None:
+                self._digest = self._source_digest
+            else:
+                self._digest = cache.key(self._source_digest, cache.array_digest(self.segments))
+        return self._digest
+
+    def file(self) -> wavfile.WaveFile:
+        """
+        The file the wave was loaded from, also if it was resampled, or None.
+        """
+        if isinstance(self.wave, resample.ResampledWave):
+            return self.wave.original
+        return self.wave if isinstance(self.wave, wavfile.WaveFile) else None
+
+    def native(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Sample positions of the wave as positions in its file. Only waves resampled on load
+        differ, the positions of all others are returned as they are.
+        """
+        if isinstance(self.wave, resample.ResampledWave):
+            return self.wave.native(positions)
+        return np.asarray(positions)
+
+    def speech_runs(self, p: int, r: int):
+        """
+        Run-length encoded noise mask of the wave, see endpoints.speech_runs. Results are cached.
+        """
+        framerate = self.wave.getframerate()
+        k = cache.key(self.digest(), "endpoints", p, r, endpoints.INITIAL_T, endpoints.WINDOW_W)
+        runs = analysis_cache.arrays(k, lambda: dict(
+            zip(["vals", "lengths"], endpoints.speech_runs(self.values, framerate, p, r))))
+        return (runs["vals"], runs["lengths"])
+
+    @profiling.profiled("find_endpoints")
     def find_endpoints(self, p: int, r: int):
         """
         Finds the endpoints of speech on the sound wave. Returns noise mask and borders.
         """
+        vals, lengths = self.speech_runs(p, r)
+        return endpoints.from_runs(vals, lengths, self.wave.getframerate())
+
+    def borders(self, p: int, r: int) -> List[float]:
+        """
+        Borders of find_endpoints alone, without expanding the noise mask to the whole wave.
+        """
+        return endpoints.borders(endpoints.segments(*self.speech_runs(p, r)), self.wave.getframerate())
+
+    def find_endpoints_reference(self, p: int, r: int):
+        """
+        Reference (loop-based) implementation of find_endpoints. Much slower, but kept to
+        verify the vectorized engine against.
+        """
 
         # Get the number of frames for the first 100ms.
         initial_t = 100
@@ -99,42 +316,86 @@ class SoundWave:
 
         return (noise_mask, noise_borders)
 
+    @profiling.profiled("clean")
     def clean(self, p: int, r: int):
         """
         Removes non-speech parts of the wave. Finds speech endpoints first with given values P and R.
         """
         if self.cleaned:
             return
-        noise_mask, _ = self.find_endpoints(p, r)
-        self.values = np.delete(self.values, ~noise_mask.astype(bool))
+        self.cut(endpoints.segments(*self.speech_runs(p, r)))
+
+    def cut(self, segments: np.ndarray):
+        """
+        Cuts the wave down to the given (n, 2) array of [start, stop) speech segments. The
+        original samples are kept, so the cut can be undone.
+        """
+        self.segments = segments
+        self._cut = None
+        self._digest = None
+        sound_waves.resized(self)
         self.cleaned = True
-        self.speech_detected = noise_mask.sum() > 0
+        self.speech_detected = len(segments) > 0
+
+    def uncut(self):
+        """
+        Undoes clean, restoring the original wave.
+        """
+        self.segments = None
+        self._cut = None
+        self._digest = None
+        sound_waves.resized(self)
+        self.cleaned = False
+        self.speech_detected = False
 
+    def original(self):
+        """
+        Returns the uncut version of the wave as a new SoundWave sharing the same samples.
+        """
+        sw = SoundWave(name=f"{self.name}-uncut", wave=self.wave, values=self.source)
+        sw._source_digest = self._source_digest
+        return sw
 
-def load_wave(filename):
+
+def resident(values: np.ndarray) -> int:
     """
-    Reads the wave file from ./input/<filename>.wav. Returns the file as a SoundWave.
+    Bytes of values held in memory: 0 for (views of) memory-mapped arrays.
     """
+    base = values
+    while base is not None:
+        if isinstance(base, (np.memmap, mmap.mmap)):
+            return 0
+        base = getattr(base, "base", None)
+    return values.nbytes
+
 
-    fpath = f"./input/{filename}.wav"
+@profiling.profiled("load_wave")
+def load_wave(filename, directory="./input", rate: int = None):
+    """
+    Reads the wave file from ./input/<filename>.wav (or another directory). Returns the file as a SoundWave.
+    Samples are memory-mapped, so nothing is read from disk until they're used. Channels of
+    a multi-channel wave are averaged (lazily), all analysis works on mono samples. If rate
+    (Hz) is given, the wave is resampled to it (lazily as well) for analysis, see
+    SoundWave.native for mapping its sample positions back to the file.
+    """
+
+    fpath = f"{directory}/{filename}.wav"
 
     # This would normally go into a try-except clause but IO errors are not important for this program.
     try:
-        wav = wave.open(fpath, "r")
+        wav = wavfile.WaveFile(fpath)
     except FileNotFoundError:
         print(f"File does not exist: {fpath}")
         return None
+    except ValueError as e:
+        print(e)
+        return None
 
-    vals = np.frombuffer(wav.readframes(-1), np.int16)
-
-    # Average of two channels if stereo file.
-    if wav.getnchannels() > 1:
-        ch1 = vals[0::2]
-        ch2 = vals[1::2]
-
-        # TODO this might be an SPOF, because we're averaging the two channels with floor division.
-        vals = (ch1 + ch2) // 2
+    vals = wav.mono()
 
+    if rate != None and rate != wav.getframerate():
+        return SoundWave(name=filename, wave=resample.ResampledWave(wav, rate),
+                         values=resample.Resampled(vals, wav.getframerate(), rate))
     return SoundWave(name=filename, wave=wav, values=vals)
 
 
@@ -142,46 +403,102 @@ def plot_waves(
         sound_waves: List[SoundWave],
         plot_type="waveform",
         window_t=None,
-        window_func: str = "none"):
+        window_func: str = "none",
+        window_start=None,
+        format: str = None):
     """
-    Plots all passed sound waves on a single plot with the given type.
+    Plots all passed sound waves on a single plot with the given type, see draw_waves. Unless
+    show_plots is set, the plot is rendered to a file in the background (png or svg, see
+    plot_format) and the path of that file is returned right away. The waves are plotted as
+    they are now, even if they're cut or uncut while the plot renders.
     """
+    if show_plots:
+        # Imported here, matplotlib alone takes longer to load than the rest of the program.
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+        try:
+            draw_waves(fig, sound_waves, plot_type, window_t, window_func, window_start)
+        except ValueError:
+            plt.close(fig)
+            raise
+        with profiling.stage("plot_waves.show"):
+            plt.show()
+        return None
+
+    waves = [copy.copy(sw) for sw in sound_waves]
+    k = cache.key(plot_type, [(sw.name, sw.digest()) for sw in waves], window_t, window_func,
+                  window_start, p, r, render.FIGSIZE, render.DPI)
+    name = "-".join(sw.name for sw in waves[:3]) + f"-{plot_type}"
+    fpath = renders.path(name, k, format or plot_format)
+    renders.submit(fpath, lambda fig: draw_waves(
+        fig, waves, plot_type, window_t, window_func, window_start))
+    return fpath
+
+
+@profiling.profiled("plot_waves")
+def draw_waves(
+        fig,
+        sound_waves: List[SoundWave],
+        plot_type="waveform",
+        window_t=None,
+        window_func: str = "none",
+        window_start=None):
+    """
+    Draws all passed sound waves on a single plot with the given type onto the matplotlib
+    figure fig. For histograms, window_start (ms) selects a single window of the wave
+    instead of averaging over all.
+    """
+    ax = fig.add_subplot()
     title = f"{plot_type.capitalize()} plot of"
 
     if plot_type == "waveform":
 
-        plt.ylabel("Amplitude")
-        plt.xlabel("Time [s]")
+        ax.set_ylabel("Amplitude")
+        ax.set_xlabel("Time [s]")
 
         for sw in sound_waves:
             axv_labelled = False
             title += f" {sw.name}.wav"
-            _, noise_borders = sw.find_endpoints(500, 5000)
-            time = np.linspace(0, len(sw.values) /
-                               sw.wave.getframerate(), num=len(sw.values))
+            framerate = sw.wave.getframerate()
+            # Borders are only drawn on uncut waves.
+            noise_borders = [] if sw.cleaned else sw.borders(p, r)
+
+            # Visible range, the whole wave unless a <start>-<end> window is given.
+            start, stop = 0, sw.length
+            if window_start != None:
+                start = int(framerate * window_start / 1000)
+                stop = min(stop, start + int(framerate * window_t / 1000))
+                if start >= stop:
+                    raise ValueError("Window exceeds the sound wave")
+                noise_borders = [x for x in noise_borders if start <= x * framerate < stop]
+
+            # Only about two points per pixel are drawn, straight from the views of the wave.
+            pixels = int(fig.get_size_inches()[0] * fig.dpi)
+            idx, y = decimate.cached(
+                (sw.digest(), start, stop, pixels),
+                lambda: decimate.pieces(sw.pieces(start, stop), pixels))
             # TODO check if okay to simply plot different times
-            plt.plot(time, sw.values, label=f"{sw.name}.wav")
+            ax.plot(idx / framerate, y, label=f"{sw.name}.wav")
             clr = np.random.rand(3,)
             if not sw.cleaned:
                 for xc in noise_borders:
                     if axv_labelled:
-                        plt.axvline(x=xc, color=clr)
+                        ax.axvline(x=xc, color=clr)
                     else:
-                        plt.axvline(x=xc, color=clr,
-                                    label=f"{sw.name} speech border")
+                        ax.axvline(x=xc, color=clr,
+                                   label=f"{sw.name} speech border")
                         axv_labelled = True
 
-        plt.title(title)
-        plt.legend()
-        plt.show()
+        ax.set_title(title)
+        ax.legend()
         return
 
     if plot_type == "histogram":
 
-        plt.ylabel("Magnitude")
-        plt.xlabel("Frequency [Hz]")
-        plt.xscale('log')
-        plt.yscale('log')
+        ax.set_ylabel("Magnitude")
+        ax.set_xlabel("Frequency [Hz]")
+        ax.set_xscale('log')
+        ax.set_yscale('log')
 
         if window_t == None:
             window_t = 100
@@ -191,19 +508,20 @@ def plot_waves(
 
             title += f" {sw.name}.wav"
             N = int(sw.wave.getframerate() * window_dur)
-            f = sw.wave.getframerate() * np.arange(N / 2) / N
+            f = sw.wave.getframerate() * np.arange(N // 2) / N
             # TODO check if okay to simply plot different freqs
-            y = dft(sw, window_t=window_t, window_func=window_func)
+            y = dft(sw, window_t=window_t, window_func=window_func, start_t=window_start)
             y = y + y.min()
             y = y / y.max() * 100
-            # plt.plot(f, y, label=f"{sw.name}.wav")
+            # ax.plot(f, y, label=f"{sw.name}.wav")
             # TODO fix
-            plt.bar(f, y, align="center", width=f[1]-f[0])
+            ax.bar(f, y, align="center", width=f[1]-f[0])
 
+        if window_start != None:
+            title += f", window={window_start}-{window_start + window_t}ms"
         title += f", window_t={window_t}, window_func={window_func}"
-        plt.title(title)
-        plt.legend()
-        plt.show()
+        ax.set_title(title)
+        ax.legend()
         return
 
     if plot_type == "spectrogram":
@@ -214,170 +532,457 @@ def plot_waves(
         sw = sound_waves[0]
         M = 1024
 
-        if window_func == "none" or window_func == None:
-            freqs, times, Sx = signal.spectrogram(
-                sw.values,
-                fs=sw.wave.getframerate(),
-                nperseg=M,
-                noverlap=M - window_t,
-                detrend=False, scaling='spectrum'
-            )
-        elif window_func in ["hamming", "hanning"]:
-            freqs, times, Sx = signal.spectrogram(
-                sw.values,
-                fs=sw.wave.getframerate(),
-                window=window_func,
-                nperseg=M,
-                noverlap=M - window_t,
-                detrend=False, scaling='spectrum'
-            )
-        else:
+        if window_func == None:
+            window_func = "none"
+        if window_func not in ["none", "hamming", "hanning"]:
             raise ValueError(
                 "window_func argument can only be one of [None, \"hamming\", \"hanning\"]")
 
-        mesh = plt.pcolormesh(times, freqs / 1000, 10 * np.log10(Sx), cmap='viridis')
-        plt.colorbar(mappable=mesh)
-        plt.ylabel('Frequency [kHz]')
-        plt.xlabel('Time [s]')
-        plt.grid(axis='y')
-        plt.title(
+        # With a <start>-<end> window, zoom into that range instead.
+        hop = window_t
+        t0, t1 = None, None
+        if window_start != None:
+            hop = 100
+            t0, t1 = window_start / 1000, (window_start + window_t) / 1000
+
+        pyr = spectrogram(sw, M, hop, window_func)
+        freqs, times, Sx = pyr.read(t0, t1, max_cols=SPECTROGRAM_COLS)
+
+        # Rasterized, a vector mesh of every spectrogram cell would make huge, slow SVGs.
+        mesh = ax.pcolormesh(times, freqs / 1000, 10 * np.log10(Sx), cmap='viridis', rasterized=True)
+        fig.colorbar(mappable=mesh, ax=ax)
+        ax.set_ylabel('Frequency [kHz]')
+        ax.set_xlabel('Time [s]')
+        ax.grid(axis='y')
+        ax.set_title(
             f"Spectrogram plot of {sw.name}.wav, window_t={window_t}, window_func={window_func}")
 
         axv_labelled = False
-        _, noise_borders = sw.find_endpoints(500, 5000)
+        noise_borders = [] if sw.cleaned else sw.borders(p, r)
         clr = np.random.rand(3,)
         if not sw.cleaned:
             for xc in noise_borders:
                 if axv_labelled:
-                    plt.axvline(x=xc, color=clr)
+                    ax.axvline(x=xc, color=clr)
                 else:
-                    plt.axvline(x=xc, color=clr,
-                                label=f"{sw.name} speech border")
+                    ax.axvline(x=xc, color=clr,
+                               label=f"{sw.name} speech border")
                     axv_labelled = True
 
-        plt.legend()
-        plt.show()
+        ax.legend()
         return
 
     raise ValueError(
         "Invalid plot_type passed to function plot_waves: " + plot_type)
 
 
-def list_waves(d, filter=None):
+def list_waves(d, terms: List[str] = []):
     """
-    Lists the available sound waves from d dictionary of SoundWave objects.
+    Lists the sound waves in the catalog matching all terms (see catalog.Catalog.query) with
+    their analysis status from the catalog, along with the memory use of those that are
+    loaded from d and whether they're cut.
     """
-    if len(d.keys()) == 0:
-        print("😥 No sound waves loaded yet. Try load <file> to load one!")
+    corpus.scan("./input")
+    try:
+        rows = corpus.query(terms)
+    except ValueError as e:
+        print(f"🤔 {e}")
         return
 
-    print("Sound waves loaded:")
-    for key in d:
-        sw = d.get(key)
-        if filter != None:
-            if filter in d:
-                if sw.cleaned:
-                    if sw.speech_detected:
-                        print(f"▶️  {key}  🔊 Speech found")
-                    else:
-                        print(f"▶️  {key}  🎶 Only noise")
-                else:
-                    print(f"▶️  {key}  📌 Not cut yet")
+    if len(rows) == 0:
+        if len(terms) == 0:
+            print("😥 No sound waves loaded yet. Try load <file> to load one!")
         else:
-            if sw.cleaned:
-                if sw.speech_detected:
-                    print(f"▶️  {key}  🔊 Speech found")
-                else:
-                    print(f"▶️  {key}  🎶 Only noise")
-            else:
-                print(f"▶️  {key}  📌 Not cut yet")
+            print("😥 No sound waves match that.")
+        return
+
+    print("Sound waves:")
+    for row in rows:
+        sw = d.peek(row["name"]) if row["name"] in d else None
+        if sw != None and not (sw.file() != None and sw.file().path == row["path"]):
+            sw = None
+        info = f"⏱️  {row['duration']:.2f} s, {row['framerate']} Hz, {row['nchannels']} ch"
+        if sw != None:
+            info += f"  💾 {sw.nbytes() / 2 ** 20:.1f} MB" + ("  ✂️  Cut" if sw.cleaned else "")
+        # The status is the one recorded in the catalog, the same the terms filter by.
+        if row["speech"] == None:
+            print(f"▶️  {row['name']}  📌 Not cut yet  {info}")
+        elif row["speech"]:
+            print(f"▶️  {row['name']}  🔊 Speech found  {info}")
+        else:
+            print(f"▶️  {row['name']}  🎶 Only noise  {info}")
+    print(f"💿 {len(rows)} sound waves, 💾 {d.usage() / 2 ** 20:.1f} MB of {d.budget / 2 ** 20:.0f} MB in memory")
 
 
 def quit():
     """
     Called for graceful app exit.
     """
+    if renders.pending:
+        print(f"⌛ Waiting for {len(renders.pending)} plot(s) to render...")
+        renders.wait()
+    report_renders()
     print("Bye! 👋")
     sys.exit(0)
 
 
-def generate_wave(name, n, t):
+@profiling.profiled("generate_wave")
+def generate_wave(name, n, t, seed: int = None, format: str = "int32"):
     """
     Generates a sinusoidal sound wave comprised of n harmonics, all totaling t duration.
+    The wave is streamed into ./output/<name>.wav chunk by chunk in the given sample format
+    (int16, int32 or float32), then memory-mapped back. The same seed gives the same wave.
     """
     framerate = 44100
-    T = np.arange(framerate * t / 1000) / framerate
-    vals = np.zeros(len(T))
-    while n > 0:
-        a = random.randint(1, 10) / 10
-        f = random.randint(10, 100)
-        omega = 2 * np.pi * f
-        vals += (a * np.sin(omega * T))
-        n -= 1
+    amps, freqs = synth.harmonics(n, seed)
 
     if not os.path.exists("./output"):
         os.makedirs("./output")
-    wav = wave.open("./output/" + name + ".wav", "wb")
-    wav.setframerate(framerate)
-    wav.setnchannels(1)
-    wav.setsampwidth(4)
+    fpath = "./output/" + name + ".wav"
+    synth.write(fpath, amps, freqs, framerate, int(framerate * t / 1000), format)
 
-    # Write sound
-    wav.writeframes(vals)
+    wav = wavfile.WaveFile(fpath)
+    return SoundWave(name, wav, wav.mono())
 
-    sw = SoundWave(name, wav, vals)
-    return sw
 
+def spectrogram(sw: SoundWave, M: int, hop: int, window_func: str):
+    """
+    Spectrogram pyramid of the sound wave with segments of M samples, each hop samples apart.
+    Pyramids are built once and kept in the analysis cache.
+    """
+    k = cache.key(sw.digest(), "pyramid", M, hop, window_func)
+    if not analysis_cache.enabled:
+        # Built into a temporary directory, removed once the pyramid isn't used anymore.
+        scratch = tempfile.TemporaryDirectory(prefix="pyramid-")
+        pyr = pyramid.build(os.path.join(scratch.name, k), sw.values, sw.wave.getframerate(),
+                            M, hop, window_func)
+        pyr.scratch = scratch
+        return pyr
+
+    prefix = analysis_cache.prefix(k)
+    pyr = pyramid.load(prefix)
+    if pyr != None:
+        analysis_cache.touch(pyramid.Pyramid.files(prefix, len(pyr.levels)))
+        return pyr
+
+    pyr = pyramid.build(prefix, sw.values, sw.wave.getframerate(), M, hop, window_func)
+    analysis_cache.add(pyramid.Pyramid.files(prefix, len(pyr.levels)))
+    return pyr
+
+
+@profiling.profiled("dft")
+def dft(sw: SoundWave, window_t: int, window_func: str, start_t: int = None, per_frame: bool = False):
+    """
+    Discrete Fourier transform. Window_t in ms. If start_t (ms) is given, only the window
+    starting there is transformed, otherwise the spectra of all consecutive windows of the
+    wave are averaged, or returned one per frame if per_frame is set. Results are cached.
+    """
+    window_func = window_func.lower()
+    if window_func not in stft.WINDOW_FUNCS:
+        return None
+    k = cache.key(sw.digest(), "dft", window_t, window_func, start_t, per_frame)
+    return analysis_cache.array(
+        k, lambda: compute_dft(sw, window_t, window_func, start_t, per_frame))
 
-def dft(sw: SoundWave, window_t: int, window_func: str):
+
+def compute_dft(sw: SoundWave, window_t: int, window_func: str, start_t: int = None, per_frame: bool = False):
     """
-    Discrete Fourier transform. Window_t in ms.
+    Computes the discrete Fourier transform of dft, bypassing the cache.
     """
 
     window_dur = window_t / 1000
-    window_func = window_func.lower()
 
     # Calculate number of samples
     N = int(sw.wave.getframerate() * window_dur)
 
-    # TODO check if we should be cutting this at all
-    y = sw.values
-
-    if len(y) == 0:
+    if sw.length == 0:
         raise ValueError("sw.values cannot be empty")
-    if window_func != "none":
-        i = 0
-        while (i < len(y) // N):
-            if window_func == "hamming":
-                y[i*N:(i+1)*N] = y[i*N:(i+1)*N] * np.hamming(N)
-            elif window_func == "hanning":
-                y[i*N:(i+1)*N] = y[i*N:(i+1)*N] * np.hanning(N)
-            else:
-                return None
-            i += 1
 
-    # Slash right side and normalize
-    y_temp = np.fft.fft(y)[0:int(N / 2)] / N
-    y_temp[1:] = 2*y_temp[1:]
+    if start_t != None:
+        start = int(sw.wave.getframerate() * start_t / 1000)
+        if start + N > sw.length:
+            raise ValueError("Window exceeds the sound wave")
+        y = sw.window(start, start + N)
+    else:
+        y = sw.values
+
+    with profiling.stage("dft.fft"):
+        if start_t != None:
+            return stft.spectra(y, N, window_func)[0]
+        if per_frame:
+            return stft.spectra(y, N, window_func)
+        return stft.average(y, N, window_func)
+
+
+def wave_fingerprint(sw: SoundWave) -> np.ndarray:
+    """
+    Spectral fingerprint of the speech in the wave, see fingerprint.fingerprint. Uncut waves
+    are fingerprinted by their speech segments (found with the current P and R) without
+    being cut; waves without speech by all of their samples. Results are cached.
+    """
+    def compute():
+        if sw.cleaned:
+            pieces = sw.views()
+        else:
+            segs = endpoints.segments(*sw.speech_runs(p, r))
+            pieces = [sw.source[a:b] for a, b in segs]
+        if sum(len(x) for x in pieces) == 0:
+            pieces = [sw.source]
+        return fingerprint.fingerprint(pieces, sw.wave.getframerate())
+
+    k = cache.key(sw.digest(), "fingerprint", p, r, fingerprint.BANDS, fingerprint.F_MIN,
+                  fingerprint.F_MAX, fingerprint.FRAME_T)
+    return analysis_cache.array(k, compute)
+
+
+def fingerprint_index(waves: List[SoundWave]) -> fingerprint.Index:
+    """
+    Index of the fingerprints of the given waves. Kept until the waves (or their cuts) change.
+    """
+    global _index
+    keys = [(sw.name, sw.digest(), p, r) for sw in waves]
+    if _index == None or _index[0] != keys:
+        vectors = np.array([wave_fingerprint(sw) for sw in waves]).reshape(len(waves), fingerprint.BANDS)
+        _index = (keys, fingerprint.Index([sw.name for sw in waves], vectors))
+    return _index[1]
+
+
+_index = None
 
-    # Calculate magnitude, remove complex part
-    FFT_y = np.abs(y_temp)
-    return FFT_y
 
+def parse_grid(text: str) -> List[int]:
+    """
+    Parses a list of values (100,200,500) or a range with a step (100-1000:100, inclusive).
+    Returns None if the text is neither.
+    """
+    m = re.fullmatch("(\\d+)-(\\d+):(\\d+)", text)
+    if m != None:
+        a, b, step = (int(x) for x in m.groups())
+        return list(range(a, b + 1, step)) if step > 0 and a <= b else None
+    if re.fullmatch("\\d+(,\\d+)*", text) != None:
+        return [int(x) for x in text.split(",")]
+    return None
 
-# Helper global dict of all loaded soundwaves.
-sound_waves: Dict[str, SoundWave] = {}
+
+def batch_segments(waves: List[SoundWave], p: int, r: int, channels: bool = False) -> Dict[str, List[np.ndarray]]:
+    """
+    Speech segments of many waves, found in as few batched calls as memory allows (see
+    endpoints.batch_segments), the same as clean would find wave by wave. Returns a list per
+    wave: one array of segments, or one per channel of its file if channels is set.
+    """
+    # Only the lengths are known up front, the samples of a row are read while its batch is
+    # built and dropped once it's done, so the waves in memory stay within the budget.
+    rows, owners, rates, lengths = [], [], [], []
+    for sw in waves:
+        if channels and sw.file() != None:
+            for c in range(sw.file().getnchannels()):
+                rows.append(lambda sw=sw, c=c: channel(sw, c))
+                owners.append(sw.name)
+                rates.append(sw.wave.getframerate())
+                lengths.append(sw.wave.getnframes())
+        else:
+            rows.append(lambda sw=sw: sw.values)
+            owners.append(sw.name)
+            rates.append(sw.wave.getframerate())
+            lengths.append(sw.length)
+
+    results = {sw.name: [] for sw in waves}
+    # Rows of similar lengths go together, so little of a batch is padding.
+    order = sorted(range(len(rows)), key=lambda i: lengths[i])
+    # A batch (of samples worked on as 64-bit floats) also stays within the memory budget.
+    limit = min(BATCH_SAMPLES, sound_waves.budget // 8)
+    start = 0
+    while start < len(order):
+        stop = start + 1
+        while stop < len(order) and (stop + 1 - start) * lengths[order[stop]] <= limit:
+            stop += 1
+        batch, batch_lengths = endpoints.pad([rows[i]() for i in order[start:stop]])
+        segs = endpoints.batch_segments(batch, batch_lengths, [rates[i] for i in order[start:stop]], p, r)
+        del batch
+        for i, x in zip(order[start:stop], segs):
+            results[owners[i]].append((i, x))
+        start = stop
+    return {name: [x for _, x in sorted(res, key=lambda y: y[0])] for name, res in results.items()}
+
+
+def channel(sw: SoundWave, i: int) -> np.ndarray:
+    """
+    Samples of the i-th channel of the file the wave was loaded from, resampled like the wave.
+    """
+    samples = wavfile.Channel(sw.file(), i)
+    if isinstance(sw.wave, resample.ResampledWave):
+        samples = resample.Resampled(samples, sw.file().getframerate(), sw.wave.framerate)
+    return np.asarray(samples)
+
+
+def speech_segments(waves: List[SoundWave]) -> Dict[str, np.ndarray]:
+    """
+    Speech segments of the waves: those of cut waves, for uncut waves the ones cut would
+    keep with the current P and R, found in one batch without cutting them.
+    """
+    uncut = [sw for sw in waves if not sw.cleaned]
+    found = batch_segments(uncut, p, r)
+    return {sw.name: sw.segments if sw.cleaned else found[sw.name][0] for sw in waves}
+
+
+@profiling.profiled("wave_features")
+def wave_features(waves: List[SoundWave], n_mels: int = features.N_MELS,
+                  n_mfcc: int = features.N_MFCC) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Log-mel spectrogram and MFCCs of the speech in the waves, see features.extract. Cut
+    waves use their speech segments, uncut waves the ones found with the current P and R
+    (in one batch, without cutting them). Returns per wave the features and the time (s) in
+    the wave where each frame starts.
+    """
+    segs = speech_segments(waves)
+    pieces = [([sw.source[a:b] for a, b in segs[sw.name]], sw.wave.getframerate()) for sw in waves]
+    results = {}
+    for sw, (log_mel, mfcc) in zip(waves, features.extract(pieces, n_mels, n_mfcc)):
+        fr = sw.wave.getframerate()
+        N, hop, _ = features.frame_sizes(fr)
+        starts = [a + hop * np.arange(len(stft.frames(sw.source[a:b], N, hop))) for a, b in segs[sw.name]]
+        times = np.concatenate(starts) / fr if starts else np.zeros(0)
+        results[sw.name] = {"log_mel": log_mel, "mfcc": mfcc, "times": times}
+    return results
+
+
+@profiling.profiled("export_waves")
+def export_waves(waves: List[SoundWave], manifest: str, n_workers: int) -> List[dict]:
+    """
+    Writes the speech of the waves (see speech_segments) to <name>-cut.wav files in
+    export.EXPORT_DIR, on n_workers threads, and a manifest of their endpoints to the
+    given path. Waves loaded from files are written from the file, at its own frame rate
+    and sample width, also if they were resampled. Waves without speech get no file.
+    Returns the rows of the manifest.
+    """
+    segs = speech_segments(waves)
+    jobs, rows = [], []
+    for sw in waves:
+        wav = sw.file()
+        if wav != None:
+            source, fr = wav.mono(), wav.getframerate()
+            sampwidth, format = wav.getsampwidth(), wav.format
+        else:
+            source, fr = sw.source, sw.wave.getframerate()
+            sampwidth, format = export.sample_format(source.dtype)
+        native = sw.native(segs[sw.name]).reshape(-1, 2)
+        fpath = os.path.join(export.EXPORT_DIR, f"{sw.name}-cut.wav")
+        if len(native) > 0:
+            jobs.append((sw.name, fpath, source, native, fr, sampwidth, format))
+        rows.append({
+            "name": sw.name, "source": wav.path if wav != None else None,
+            "output": fpath if len(native) > 0 else None, "framerate": fr,
+            "duration": len(source) / fr,
+            "speech_duration": int((native[:, 1] - native[:, 0]).sum()) / fr,
+            "speech_detected": len(native) > 0, "segments": native.tolist(),
+            "borders": endpoints.borders(native, fr)})
+
+    os.makedirs(export.EXPORT_DIR, exist_ok=True)
+    written, errors = export.write_all(jobs, n_workers, print_progress if len(jobs) > 1 else None)
+    for name, e in errors.items():
+        print(f"❌ Error while exporting {name}: {e}")
+    rows = [row for row in rows if row["name"] not in errors]
+    with profiling.stage("export.manifest"):
+        export.write_manifest(manifest, rows)
+    return rows
+
+
+def tune(waves: List[SoundWave], ps: List[int], rs: List[int], n_workers: int) -> Dict[str, list]:
+    """
+    Finds the speech segments of the (uncut) waves for every combination of ps and rs. The
+    frame energies of every wave are computed only once. Waves loaded from files are swept
+    on the process pool. Returns the segments of each wave, indexed [p][r].
+    """
+    results = {}
+    pooled = [sw for sw in waves if isinstance(sw.wave, wavfile.WaveFile)]
+    if n_workers > 1 and len(pooled) > 1:
+        jobs = [(sw.name, sw.wave.path) for sw in pooled]
+        results, errors = batch.tune(jobs, ps, rs, workers=n_workers, progress=print_progress)
+        for name, e in errors.items():
+            print(f"❌ Error while tuning {name}: {e}")
+    for sw in waves:
+        if sw.name not in results:
+            vals, lengths = endpoints.frame_runs(sw.source, sw.wave.getframerate())
+            results[sw.name] = endpoints.sweep(vals, lengths, ps, rs)
+    return results
+
+
+def print_stats(summary):
+    """
+    Prints rolling per-stage timings and memory peaks.
+    """
+    if len(summary) == 0:
+        print("😥 Nothing measured yet. Run some commands first!")
+        return
+
+    print(f"{'Stage':<24} {'Runs':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'CPU p50':>9} {'Peak MB':>9}")
+    for name, st in sorted(summary.items()):
+        print(f"{name:<24} {st['count']:>5} {st['wall_p50'] * 1000:>9.1f} {st['wall_p90'] * 1000:>9.1f} "
+              f"{st['wall_p99'] * 1000:>9.1f} {st['cpu_p50'] * 1000:>9.1f} "
+              + (f"{st['peak_max'] / 2 ** 20:>9.1f}" if st['peak_max'] != None else f"{'-':>9}"))
+    if not profiling.tracking_memory():
+        print("\nMemory peaks aren't tracked, use stats mem on to track them.")
+
+
+def print_plot(fpath: str):
+    """
+    Tells where the plot plot_waves returned ends up, if it's rendered to a file.
+    """
+    if fpath == None:
+        return
+    if os.path.exists(fpath):
+        print(f"🖼️  Already rendered: {fpath}")
+    else:
+        print(f"⏳ Rendering in the background to {fpath}")
+
+
+def report_renders():
+    """
+    Prints the plots that finished rendering since the last report.
+    """
+    for fpath, e in renders.finished():
+        if e == None:
+            print(f"🖼️  Plot rendered: {fpath}")
+        elif isinstance(e, ValueError):
+            print(f"{TEXT_INVALID_SYNTAX_PLOT_WINDOW} ({fpath})")
+        else:
+            print(f"❌ Error while rendering {fpath}: {e}")
+
+
+def print_progress(done: int, total: int, name: str):
+    """
+    Prints the progress of a batch run on a single, overwritten line.
+    """
+    print(f"⏳ {done}/{total} {name}".ljust(60), end="\n" if done == total else "\r")
+
+
+# Persistent cache of analysis results.
+analysis_cache = cache.Cache()
+
+# Plots rendering in the background.
+renders = render.RenderQueue()
+
+# Persistent catalog of all known .wav files, opened on start.
+corpus: catalog.Catalog = None
+
+# Helper global registry of all loaded soundwaves.
+sound_waves: Dict[str, SoundWave] = registry.Registry(memory_budget)
 
 
 def main():
+    global corpus
+
     print(TEXT_WELCOME)
+    sound_waves.budget = memory_budget
+    corpus = catalog.Catalog()
+    corpus.scan("./input")
 
     if auto_load:
+        # Only the headers are read here, samples are memory-mapped and decoded on first use.
         print("⌛ Loading all WAVs from ./input...")
-        files = os.listdir("./input")
-        for f in files:
+        for f in os.listdir("./input"):
             fname = f[:-4]
-            sw = load_wave(fname)
+            sw = load_wave(fname, rate=analysis_rate)
             if sw != None:
                 sound_waves[fname] = sw
             else:
@@ -386,8 +991,15 @@ def main():
 
     print("\n🚀 Enter your commands below:")
 
+    command = None
     while True:
 
+        # Every path through a command ends up back here, so this is where it's finished.
+        profiling.end(command)
+        command = None
+        sound_waves.trim()
+        report_renders()
+
         cmd = input("\n> ").strip().split(" ")
         cmd = [x.strip() for x in cmd if x.strip() != ""]
 
@@ -395,9 +1007,20 @@ def main():
             continue
 
         func = cmd[0].lower()
+        command = profiling.begin(f"cmd:{func}")
 
         if func == "cut":
 
+            # Number of worker processes, -j <n>
+            n_workers = workers
+            if "-j" in cmd:
+                i = cmd.index("-j")
+                if i + 1 >= len(cmd) or re.search("\\D", cmd[i + 1]) != None or int(cmd[i + 1]) < 1:
+                    print(TEXT_INVALID_SYNTAX_CUT_WORKERS)
+                    continue
+                n_workers = int(cmd[i + 1])
+                cmd = cmd[:i] + cmd[i + 2:]
+
             if len(cmd) == 1:
                 to_clean = sound_waves.values()
             else:
@@ -413,6 +1036,21 @@ def main():
                 if br:
                     continue
 
+            # Waves backed by a file are cut on the process pool.
+            pooled = [sw for sw in to_clean
+                      if not sw.cleaned and isinstance(sw.wave, wavfile.WaveFile)]
+            if n_workers > 1 and len(pooled) > 1:
+                jobs = [(sw.name, sw.wave.path) for sw in pooled]
+                results, errors = batch.run(
+                    jobs, p, r, workers=n_workers, progress=print_progress)
+                for sw in pooled:
+                    res = results.get(sw.name, None)
+                    if res == None:
+                        print(f"❌ Error while cutting {sw.name}: {errors[sw.name]}")
+                        continue
+                    sw.cut(res.segments)
+                to_clean = [sw for sw in to_clean if sw.name not in errors]
+
             for sw in to_clean:
                 sw.clean(p, r)
                 if sw.speech_detected:
@@ -420,7 +1058,79 @@ def main():
                 else:
                     print(f"🚩 No speech detected in {sw.name}!")
 
+            corpus.record([(sw.file().path, sw.speech_detected,
+                            len(endpoints.borders(sw.segments, sw.wave.getframerate())))
+                           for sw in to_clean if sw.file() != None], p, r)
+
+        elif func == "uncut":
+
+            if len(cmd) == 1:
+                to_restore = sound_waves.values()
+            else:
+                to_restore = []
+                for f in cmd[1:]:
+                    sw = sound_waves.get(f, None)
+                    if sw == None:
+                        print(TEXT_NOT_LOADED % f)
+                        continue
+                    to_restore.append(sw)
+
+            for sw in to_restore:
+                if sw.cleaned:
+                    sw.uncut()
+                    print(f"✅ Sound wave {sw.name} restored")
+
+        elif func == "stream":
+
+            if len(cmd) < 2:
+                print(TEXT_INVALID_SYNTAX)
+                print(TEXT_STREAM)
+                continue
+
+            if not os.path.exists("./output"):
+                os.makedirs("./output")
+
+            for fn in cmd[1:]:
+                src = f"./input/{fn}.wav"
+                dst = f"./output/{fn}-cut.wav"
+                try:
+                    read, written = stream.clean_stream(src, dst, p, r)
+                except FileNotFoundError:
+                    print(f"File does not exist: {src}")
+                    continue
+                except ValueError as e:
+                    print(e)
+                    continue
+                if written > 0:
+                    print(f"✅ Sound wave {fn} cleaned, {written}/{read} frames saved to {dst}")
+                else:
+                    print(f"🚩 No speech detected in {fn}!")
+
         elif func == "gen":
+
+            seed = None
+            fmt = "int32"
+            invalid = False
+            for flag in ["-s", "-f"]:
+                if flag not in cmd:
+                    continue
+                i = cmd.index(flag)
+                if i + 1 >= len(cmd) or (flag == "-s" and re.search("\\D", cmd[i + 1]) != None) \
+                        or (flag == "-f" and cmd[i + 1] not in synth.FORMATS):
+                    invalid = True
+                    break
+                if flag == "-s":
+                    seed = int(cmd[i + 1])
+                else:
+                    fmt = cmd[i + 1]
+                del cmd[i:i + 2]
+            if invalid:
+                print(TEXT_INVALID_SYNTAX_GEN)
+                print(TEXT_GEN)
+                continue
+            if seed == None:
+                seed = random.randrange(2 ** 32)
+
             if len(cmd) < 2:
                 name = "wave-" + str(len(sound_waves.keys()))
             else:
@@ -451,17 +1161,15 @@ def main():
 
                 t = int(cmd[3])
 
-            sw = generate_wave(name, n, t)
-            print(TEXT_GENERATED + name)
+            sw = generate_wave(name, n, t, seed, fmt)
+            corpus.add(sw.wave.path)
+            print(TEXT_GENERATED + name + f" (seed {seed})")
             print(TEXT_PLOTTING)
             sound_waves[sw.name] = sw
-            plot_waves([sw])
+            print_plot(plot_waves([sw]))
 
         elif func == "list":
-            if len(cmd) > 1:
-                list_waves(sound_waves, cmd[1])
-            else:
-                list_waves(sound_waves)
+            list_waves(sound_waves, cmd[1:])
             continue
 
         elif func == "load":
@@ -471,21 +1179,39 @@ def main():
                 print(TEXT_LOAD)
                 continue
 
+            # Analysis frame rate, -r <rate>
+            rate = analysis_rate
+            if "-r" in cmd:
+                i = cmd.index("-r")
+                if i + 1 >= len(cmd) or re.search("\\D", cmd[i + 1]) != None or int(cmd[i + 1]) < 1:
+                    print(TEXT_INVALID_SYNTAX_LOAD_RATE)
+                    continue
+                rate = int(cmd[i + 1])
+                cmd = cmd[:i] + cmd[i + 2:]
+
             for fn in cmd[1:]:
-                if sound_waves.get(fn, None) != None:
+                sw = sound_waves.get(fn, None)
+                if sw != None and (rate == None or sw.wave.getframerate() == rate):
                     print(f"✅ File already loaded, skipping: {fn}")
                     continue
 
-                w = load_wave(fn)
+                w = load_wave(fn, rate=rate)
                 if w != None:
                     sound_waves[fn] = w
-                    print(f"✅ Sound wave loaded: {fn}")
+                    if isinstance(w.wave, resample.ResampledWave):
+                        print(f"✅ Sound wave loaded: {fn}, resampled from "
+                              f"{w.wave.original.getframerate()} Hz to {rate} Hz")
+                    else:
+                        print(f"✅ Sound wave loaded: {fn}")
 
         elif func == "plot":
 
             plot_type = "waveform"
             window_t = 100
+            window_start = None
             window_f = "none"
+            plot_f = None
+            show_uncut = False
             to_compare = []
 
             # Fetch window t and function
@@ -494,19 +1220,32 @@ def main():
             prev = None
             err = False
             pot_missing = None
-            arg_flags = ["-w", "-f", "-t"]
+            arg_flags = ["-w", "-f", "-t", "-e"]
             for arg in cmd_lowered:
 
                 if arg == "plot":
                     continue
 
+                # Plot uncut originals of cut waves too, -o
+                if arg == "-o" and prev not in arg_flags:
+                    show_uncut = True
+                    prev = arg
+                    continue
+
                 # If special arg
                 if prev in arg_flags:
                     pot_missing = None
 
                     if prev == "-w":
+                        # Either a window length or a <start>-<end> range
                         try:
-                            window_t = int(arg)
+                            if "-" in arg:
+                                start, end = [int(x) for x in arg.split("-")]
+                                if end <= start:
+                                    raise ValueError()
+                                window_start, window_t = start, end - start
+                            else:
+                                window_t = int(arg)
                         except:
                             print(TEXT_INVALID_SYNTAX_PLOT_WINDOW_T)
                             err = True
@@ -519,6 +1258,13 @@ def main():
                             break
                         window_f = arg
 
+                    elif prev == "-e":
+                        if arg not in render.FORMATS:
+                            print(TEXT_INVALID_SYNTAX_PLOT_FORMAT % arg)
+                            err = True
+                            break
+                        plot_f = arg
+
                     else:
                         if arg not in ["waveform", "spectrogram", "histogram"]:
                             print(TEXT_INVALID_SYNTAX_PLOT_TYPE % arg)
@@ -546,7 +1292,11 @@ def main():
                 continue
 
             if len(to_compare) == 0:
-                to_compare = sound_waves.values()
+                to_compare = list(sound_waves.values())
+
+            if show_uncut:
+                to_compare = [x for sw in to_compare
+                              for x in ([sw, sw.original()] if sw.cleaned else [sw])]
 
             print(TEXT_PLOTTING)
 
@@ -554,11 +1304,246 @@ def main():
                 print(TEXT_INVALID_SYNTAX_PLOT_TOO_MANY % plot_type)
                 continue
 
-            # try:
-            plot_waves(to_compare, plot_type=plot_type,
-                       window_t=window_t, window_func=window_f)
-            # except ValueError:
-            # print(TEXT_INVALID_SYNTAX_PLOT_WINDOW)
+            try:
+                fpath = plot_waves(to_compare, plot_type=plot_type, window_t=window_t,
+                                   window_func=window_f, window_start=window_start, format=plot_f)
+            except ValueError:
+                print(TEXT_INVALID_SYNTAX_PLOT_WINDOW)
+                continue
+            print_plot(fpath)
+
+        elif func == "stats":
+
+            if len(cmd) > 1 and cmd[1] == "reset":
+                profiling.reset()
+                print("✅ Stats cleared")
+            elif len(cmd) > 1 and cmd[1] == "mem":
+                if len(cmd) < 3 or cmd[2] not in ["on", "off"]:
+                    print(TEXT_INVALID_SYNTAX)
+                    print(TEXT_STATS)
+                else:
+                    profiling.track_memory(cmd[2] == "on")
+                    print(f"✅ Memory tracking {'started, commands will run slower' if cmd[2] == 'on' else 'stopped'}")
+            elif len(cmd) > 1 and cmd[1] == "trace":
+                if len(cmd) < 3:
+                    print(TEXT_INVALID_SYNTAX)
+                    print(TEXT_STATS)
+                elif cmd[2] == "off":
+                    profiling.trace(None)
+                    print("✅ Tracing stopped")
+                else:
+                    profiling.trace(cmd[2])
+                    print(f"✅ Tracing stages to {cmd[2]}")
+            else:
+                print_stats(profiling.summary())
+
+        elif func == "compare":
+
+            names = cmd[1:] if len(cmd) > 1 else list(sound_waves)
+            missing = [x for x in names if x not in sound_waves]
+            if missing:
+                print(TEXT_NOT_LOADED % missing[0])
+                continue
+            if len(names) < 2:
+                print(TEXT_INVALID_SYNTAX)
+                print(TEXT_COMPARE)
+                continue
+
+            index = fingerprint_index([sound_waves.peek(x) for x in sound_waves])
+            if len(names) <= COMPARE_TABLE:
+                d = index.distances(names)
+                width = max(len(x) for x in names)
+                print(" " * width + "".join(f"  {x[:10]:>10}" for x in names))
+                for name, row in zip(names, d):
+                    print(f"{name:<{width}}" + "".join(f"  {x:>10.4f}" for x in row))
+            else:
+                print("🔗 Most similar sound waves:")
+                for a, b, dist in fingerprint.Index(names, index.matrix[[index.rows[x] for x in names]]).closest_pairs(10):
+                    print(f"   {a} ~ {b}  {dist:.4f}")
+
+        elif func == "match":
+
+            k = 5
+            if "-k" in cmd:
+                i = cmd.index("-k")
+                if i + 1 >= len(cmd) or re.search("\\D", cmd[i + 1]) != None or int(cmd[i + 1]) < 1:
+                    print(TEXT_INVALID_SYNTAX)
+                    print(TEXT_MATCH)
+                    continue
+                k = int(cmd[i + 1])
+                cmd = cmd[:i] + cmd[i + 2:]
+            if len(cmd) != 2:
+                print(TEXT_INVALID_SYNTAX)
+                print(TEXT_MATCH)
+                continue
+            if cmd[1] not in sound_waves:
+                print(TEXT_NOT_LOADED % cmd[1])
+                continue
+
+            index = fingerprint_index([sound_waves.peek(x) for x in sound_waves])
+            print(f"🔎 Closest to {cmd[1]}:")
+            for name, dist in index.knn(index.matrix[index.rows[cmd[1]]], k, exclude=cmd[1]):
+                print(f"   {name}  {dist:.4f}")
+
+        elif func == "tune":
+
+            ps, rs = TUNE_P, TUNE_R
+            n_workers = workers
+            invalid = False
+            for flag in ["-p", "-r", "-j"]:
+                if flag not in cmd:
+                    continue
+                i = cmd.index(flag)
+                grid = parse_grid(cmd[i + 1]) if i + 1 < len(cmd) else None
+                if grid == None or len(grid) == 0 or flag == "-j" and (len(grid) != 1 or grid[0] < 1):
+                    invalid = True
+                    break
+                if flag == "-p":
+                    ps = grid
+                elif flag == "-r":
+                    rs = grid
+                else:
+                    n_workers = grid[0]
+                del cmd[i:i + 2]
+            if invalid:
+                print(TEXT_INVALID_SYNTAX)
+                print(TEXT_TUNE)
+                continue
+
+            names = cmd[1:] if len(cmd) > 1 else list(sound_waves)
+            missing = [x for x in names if x not in sound_waves]
+            if missing:
+                print(TEXT_NOT_LOADED % missing[0])
+                continue
+            waves = [sound_waves[x] for x in names]
+
+            results = tune(waves, ps, rs, n_workers)
+
+            # Waves with speech for every combination, P down and R across.
+            print(f"🎛️  Waves with speech found (of {len(results)}), P down, R across:")
+            print("P \\ R  " + "".join(f"{x:>7}" for x in rs))
+            for i, pv in enumerate(ps):
+                counts = [sum(len(res[i][j]) > 0 for res in results.values()) for j in range(len(rs))]
+                print(f"{pv:>6}  " + "".join(f"{x:>7}" for x in counts))
+
+            if not os.path.exists("./output"):
+                os.makedirs("./output")
+            report = {"p": ps, "r": rs, "waves": {}}
+            for sw in waves:
+                if sw.name not in results:
+                    continue
+                fr = sw.wave.getframerate()
+                # Segments are positions in the file, also for waves resampled on load.
+                report["waves"][sw.name] = [[
+                    {"p": pv, "r": rv, "speech_detected": len(segs) > 0,
+                     "segments": sw.native(segs).tolist(), "borders": endpoints.borders(segs, fr)}
+                    for rv, segs in zip(rs, row)] for pv, row in zip(ps, results[sw.name])]
+            with open("./output/tune.json", "w") as f:
+                json.dump(report, f)
+            print("💾 Endpoints of every combination saved to ./output/tune.json")
+
+        elif func == "endpoints":
+
+            # Per channel of the files, -c
+            channels = "-c" in cmd
+            cmd = [x for x in cmd if x != "-c"]
+
+            names = cmd[1:] if len(cmd) > 1 else list(sound_waves)
+            missing = [x for x in names if x not in sound_waves]
+            if missing:
+                print(TEXT_NOT_LOADED % missing[0])
+                continue
+
+            waves = [sound_waves[x] for x in names]
+            results = batch_segments(waves, p, r, channels)
+            for sw in waves:
+                fr = sw.wave.getframerate()
+                for c, segs in enumerate(results[sw.name]):
+                    label = f"{sw.name} [ch {c + 1}]" if channels and len(results[sw.name]) > 1 else sw.name
+                    if len(segs) == 0:
+                        print(f"🚩 {label}: no speech")
+                    else:
+                        print(f"🔊 {label}: " + ", ".join(f"{a / fr:.3f}-{(b - 1) / fr:.3f} s" for a, b in segs))
+
+        elif func == "features":
+
+            n_mels, n_mfcc = features.N_MELS, features.N_MFCC
+            invalid = False
+            for flag in ["-m", "-c"]:
+                if flag not in cmd:
+                    continue
+                i = cmd.index(flag)
+                if i + 1 >= len(cmd) or re.search("\\D", cmd[i + 1]) != None or int(cmd[i + 1]) < 1:
+                    invalid = True
+                    break
+                if flag == "-m":
+                    n_mels = int(cmd[i + 1])
+                else:
+                    n_mfcc = int(cmd[i + 1])
+                del cmd[i:i + 2]
+            if invalid or n_mfcc > n_mels:
+                print(TEXT_INVALID_SYNTAX)
+                print(TEXT_FEATURES)
+                continue
+
+            names = cmd[1:] if len(cmd) > 1 else list(sound_waves)
+            missing = [x for x in names if x not in sound_waves]
+            if missing:
+                print(TEXT_NOT_LOADED % missing[0])
+                continue
+
+            results = wave_features([sound_waves[x] for x in names], n_mels, n_mfcc)
+            os.makedirs("./output/features", exist_ok=True)
+            frames = 0
+            for name, res in results.items():
+                np.savez(f"./output/features/{name}.npz", **res)
+                frames += len(res["times"])
+            print(f"💾 {n_mels} log-mel bands and {n_mfcc} MFCCs of {frames} frames of speech "
+                  f"in {len(results)} sound waves saved to ./output/features/<name>.npz")
+
+        elif func == "export":
+
+            # Number of writer threads, -j <n>, and manifest format, -m <json|csv>
+            n_workers = workers
+            fmt = "json"
+            invalid = False
+            for flag in ["-j", "-m"]:
+                if flag not in cmd:
+                    continue
+                i = cmd.index(flag)
+                if i + 1 >= len(cmd):
+                    invalid = True
+                    break
+                if flag == "-j":
+                    if re.search("\\D", cmd[i + 1]) != None or int(cmd[i + 1]) < 1:
+                        invalid = True
+                        break
+                    n_workers = int(cmd[i + 1])
+                elif cmd[i + 1] not in export.FORMATS:
+                    invalid = True
+                    break
+                else:
+                    fmt = cmd[i + 1]
+                del cmd[i:i + 2]
+            if invalid:
+                print(TEXT_INVALID_SYNTAX_EXPORT)
+                print(TEXT_EXPORT)
+                continue
+
+            names = cmd[1:] if len(cmd) > 1 else list(sound_waves)
+            missing = [x for x in names if x not in sound_waves]
+            if missing:
+                print(TEXT_NOT_LOADED % missing[0])
+                continue
+
+            manifest = os.path.join(export.EXPORT_DIR, f"manifest.{fmt}")
+            rows = export_waves([sound_waves[x] for x in names], manifest, n_workers)
+            for row in rows:
+                if not row["speech_detected"]:
+                    print(f"🚩 No speech detected in {row['name']}!")
+            saved = sum(row["speech_detected"] for row in rows)
+            print(f"💾 Speech of {saved} sound waves saved to {export.EXPORT_DIR}/<filename>-cut.wav, "
+                  f"endpoints of {len(rows)} to {manifest}")
 
         elif func == "quit":
             quit()
@@ -566,12 +1551,21 @@ def main():
         else:
             print("\n=== Help ===\n")
             print(f"{TEXT_CLEAN}\n")
+            print(f"{TEXT_COMPARE}\n")
+            print(f"{TEXT_ENDPOINTS}\n")
+            print(f"{TEXT_EXPORT}\n")
+            print(f"{TEXT_FEATURES}\n")
             print(f"{TEXT_GEN}\n")
             print(f"{TEXT_HELP}\n")
             print(f"{TEXT_LIST}\n")
             print(f"{TEXT_LOAD}\n")
+            print(f"{TEXT_MATCH}\n")
             print(f"{TEXT_PLOT}\n")
-            print(f"{TEXT_QUIT}")
+            print(f"{TEXT_QUIT}\n")
+            print(f"{TEXT_STATS}\n")
+            print(f"{TEXT_STREAM}\n")
+            print(f"{TEXT_TUNE}\n")
+            print(f"{TEXT_UNCUT}")
 
 
 if __name__ == "__main__":
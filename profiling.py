@@ -0,0 +1,192 @@
+from collections import deque
+from functools import wraps
+from typing import Dict
+import json
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+
+# Whether stages are recorded at all.
+enabled = True
+# Number of most recent runs of a stage kept for the rolling percentiles.
+WINDOW = 200
+# Environment variable naming a JSON-lines file to trace into, for headless runs.
+TRACE_ENV = "SOUNDWAVE_TRACE"
+# Environment variable that turns on memory tracking from the start, if set to 1.
+MEMORY_ENV = "SOUNDWAVE_MEMORY"
+
+# Rolling records per stage name: deque of (wall, cpu, peak). Peak is None if memory
+# wasn't tracked during the stage, or the stage ran on another thread than the main one.
+records: Dict[str, deque] = {}
+# Whether memory peaks are tracked, see track_memory.
+_memory = False
+# Stages currently running, innermost last. Every thread has its own.
+_local = threading.local()
+_trace = None
+
+
+class Stage:
+    """
+    A single running stage. Remembers its start and the highest memory peak of its children.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.mem = None
+        self.child_peak = 0
+        # The tracemalloc peak is global to the process, so only main thread stages reset and
+        # record it. Stages on other threads (like plot renders) only record their times.
+        if _memory and tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread():
+            self.mem, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this stage, so hand the one so far over to the parent.
+            stack = _stack()
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+
+
+def begin(name: str) -> Stage:
+    """
+    Starts recording a stage. Every begin must be matched with an end.
+    """
+    if not enabled:
+        return None
+    s = Stage(name)
+    _stack().append(s)
+    return s
+
+
+def end(s: Stage):
+    """
+    Finishes a stage started with begin, recording its wall time, CPU time and memory peak.
+    """
+    stack = _stack()
+    if s is None or s not in stack:
+        return
+    # Stages left open inside (by an exception) are finished along with this one.
+    while stack[-1] is not s:
+        end(stack[-1])
+    stack.pop()
+
+    wall = time.perf_counter() - s.wall
+    cpu = time.process_time() - s.cpu
+    peak = None
+    if s.mem is not None and _memory and tracemalloc.is_tracing():
+        abs_peak = max(tracemalloc.get_traced_memory()[1], s.child_peak)
+        peak = max(0, abs_peak - s.mem)
+        if stack:
+            stack[-1].child_peak = max(stack[-1].child_peak, abs_peak)
+
+    records.setdefault(s.name, deque(maxlen=WINDOW)).append((wall, cpu, peak))
+    if _trace is not None:
+        _trace.write(json.dumps({
+            "ts": time.time(), "stage": s.name, "depth": len(stack),
+            "parent": stack[-1].name if stack else None,
+            "wall": wall, "cpu": cpu, "peak": peak}) + "\n")
+        _trace.flush()
+
+
+class stage:
+    """
+    Context manager recording the enclosed block as a stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.s = begin(self.name)
+        return self.s
+
+    def __exit__(self, *exc):
+        end(self.s)
+        return False
+
+
+def profiled(name: str):
+    """
+    Decorator recording every call of the function as a stage.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def track_memory(on: bool):
+    """
+    Turns tracking of memory peaks (with tracemalloc) on or off. It's off by default: while
+    tracemalloc runs, every allocation is slower, and importing scipy or matplotlib takes
+    several times as long. Wall and CPU times are always recorded.
+    """
+    global _memory
+    if on and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not on and _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = on
+
+
+def tracking_memory() -> bool:
+    return _memory
+
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def summary() -> Dict[str, dict]:
+    """
+    Rolling statistics per stage: count, wall and CPU time percentiles (s) and memory peaks
+    (bytes), None for stages that ran without memory tracking.
+    """
+    out = {}
+    # A copy, stages may finish on other threads meanwhile.
+    for name, recs in list(records.items()):
+        recs = list(recs)
+        arr = np.array([(w, c) for w, c, _ in recs], dtype=np.float64)
+        peaks = np.array([m for _, _, m in recs if m is not None], dtype=np.float64)
+        wall = np.percentile(arr[:, 0], [50, 90, 99])
+        out[name] = {
+            "count": len(recs),
+            "wall_p50": wall[0], "wall_p90": wall[1], "wall_p99": wall[2],
+            "cpu_p50": np.percentile(arr[:, 1], 50),
+            "peak_p50": np.percentile(peaks, 50) if len(peaks) else None,
+            "peak_max": peaks.max() if len(peaks) else None,
+        }
+    return out
+
+
+def trace(fpath: str):
+    """
+    Starts appending every finished stage to a JSON-lines file. None stops tracing.
+    """
+    global _trace
+    if _trace is not None:
+        _trace.close()
+        _trace = None
+    if fpath:
+        _trace = open(fpath, "a")
+
+
+def reset():
+    """
+    Forgets all recorded stages.
+    """
+    records.clear()
+
+
+if os.environ.get(TRACE_ENV):
+    trace(os.environ[TRACE_ENV])
+if os.environ.get(MEMORY_ENV) == "1":
+    track_memory(True)
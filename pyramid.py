@@ -0,0 +1,151 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import json
+import os
+import numpy as np
+
+
+# Number of spectrogram columns (time segments) computed by one worker at once.
+BLOCK_COLS = 2048
+# Width of a tile in columns. Reads are aligned to tiles, and the pyramid stops once a
+# level fits into a single tile.
+TILE_COLS = 512
+
+
+def window(M: int, window_func: str) -> np.ndarray:
+    """
+    Window of the spectrogram segments, the same scipy.signal.spectrogram would use.
+    Without a window function, that's scipy's default Tukey window.
+    """
+    from scipy.signal import get_window
+
+    if window_func in [None, "none"]:
+        return get_window(("tukey", 0.25), M)
+    return get_window("hann" if window_func == "hanning" else window_func, M)
+
+
+class Pyramid:
+    """
+    Spectrogram stored on disk as a pyramid of levels. Level 0 holds every segment, each
+    next level averages pairs of columns of the previous one. Every level is a memory-mapped
+    .npy of (columns, frequencies), so reading a time range only touches its own tiles.
+    """
+
+    def __init__(self, prefix: str):
+        with open(prefix + ".json") as f:
+            meta = json.load(f)
+        self.prefix = prefix
+        self.framerate = meta["framerate"]
+        self.M = meta["M"]
+        self.hop = meta["hop"]
+        self.cols = meta["cols"]
+        self.freqs = np.fft.rfftfreq(self.M, 1 / self.framerate)
+        self.levels = [np.load(f"{prefix}.L{i}.npy", mmap_mode="r") for i in range(meta["levels"])]
+        # Temporary directory holding the files, if any. It's removed along with the pyramid.
+        self.scratch = None
+
+    @staticmethod
+    def files(prefix: str, levels: int) -> List[str]:
+        return [prefix + ".json"] + [f"{prefix}.L{i}.npy" for i in range(levels)]
+
+    def times(self, level: int, start: int, stop: int) -> np.ndarray:
+        """
+        Center times (s) of columns [start, stop) of the given level.
+        """
+        scale = 2 ** level
+        cols = np.arange(start, stop) * scale + (scale - 1) / 2
+        return (self.M / 2 + cols * self.hop) / self.framerate
+
+    def read(self, t0: float = None, t1: float = None, max_cols: int = 2000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Reads the spectrogram between times t0 and t1 (s) at the finest level that has at
+        most max_cols columns in that range. Returns frequencies, times and the
+        (frequencies, times) spectrogram, like scipy.signal.spectrogram.
+        """
+        c0 = 0 if t0 is None else max(0, int((t0 * self.framerate - self.M / 2) // self.hop))
+        c1 = self.cols if t1 is None else min(self.cols, int(np.ceil((t1 * self.framerate - self.M / 2) / self.hop)) + 1)
+        c1 = max(c1, c0 + 1)
+
+        level = 0
+        while level + 1 < len(self.levels) and (c1 - c0) / 2 ** level > max_cols:
+            level += 1
+        scale = 2 ** level
+
+        # Read whole tiles of the chosen level, then trim them to the range.
+        lvl = self.levels[level]
+        lo, hi = c0 // scale, min(len(lvl), -(-c1 // scale))
+        a = lo // TILE_COLS * TILE_COLS
+        b = min(len(lvl), -(-hi // TILE_COLS) * TILE_COLS)
+        tiles = np.asarray(lvl[a:b])
+        return (self.freqs, self.times(level, lo, hi), tiles[lo - a:hi - a].T)
+
+
+def build(
+        prefix: str,
+        values: np.ndarray,
+        framerate: int,
+        M: int = 1024,
+        hop: int = 100,
+        window_func: str = "none",
+        workers: int = None) -> Pyramid:
+    """
+    Computes the spectrogram of values (segments of M samples, hop samples apart) in blocks
+    of time on a pool of worker threads, writing it straight into memory-mapped .npy files
+    named after prefix. Then builds the pyramid of downsampled levels from it, also block by
+    block. Scaling matches scipy.signal.spectrogram(..., detrend=False, scaling="spectrum").
+    """
+    if hop < 1 or hop > M:
+        raise ValueError(f"Spectrogram hop must be between 1 and {M}")
+    if len(values) < M:
+        raise ValueError("Sound wave is shorter than a single spectrogram segment")
+
+    w = window(M, window_func)
+    scale = 1 / w.sum() ** 2
+    frames = np.lib.stride_tricks.sliding_window_view(values, M)[::hop]
+    cols = len(frames)
+
+    level = np.lib.format.open_memmap(
+        f"{prefix}.L0.npy", mode="w+", dtype=np.float32, shape=(cols, M // 2 + 1))
+
+    def compute(start: int):
+        fr = frames[start:start + BLOCK_COLS]
+        spec = np.fft.rfft(fr * w, axis=1)
+        spec = (spec.real ** 2 + spec.imag ** 2) * scale
+        # One-sided spectrum, all bins but DC (and Nyquist) count twice.
+        spec[:, 1:(M + 1) // 2] *= 2
+        level[start:start + BLOCK_COLS] = spec
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(compute, range(0, cols, BLOCK_COLS)))
+    level.flush()
+
+    n = 1
+    while len(level) > TILE_COLS:
+        prev = level
+        level = np.lib.format.open_memmap(
+            f"{prefix}.L{n}.npy", mode="w+", dtype=np.float32, shape=((len(prev) + 1) // 2, prev.shape[1]))
+        for start in range(0, len(prev), 2 * BLOCK_COLS):
+            block = np.asarray(prev[start:start + 2 * BLOCK_COLS])
+            if len(block) % 2 == 1:
+                block = np.concatenate((block, block[-1:]))
+            level[start // 2:start // 2 + len(block) // 2] = \
+                block.reshape(-1, 2, block.shape[1]).mean(axis=1)
+        level.flush()
+        n += 1
+
+    with open(prefix + ".json", "w") as f:
+        json.dump({"framerate": framerate, "M": M, "hop": hop, "cols": cols, "levels": n}, f)
+    return Pyramid(prefix)
+
+
+def load(prefix: str) -> Pyramid:
+    """
+    Opens a previously built pyramid, or returns None if any of its files is missing.
+    """
+    if not os.path.exists(prefix + ".json"):
+        return None
+    with open(prefix + ".json") as f:
+        levels = json.load(f)["levels"]
+    if not all(os.path.exists(x) for x in Pyramid.files(prefix, levels)):
+        return None
+    return Pyramid(prefix)
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import numpy as np
+
+
+# Default memory budget (bytes) for decoded samples of all loaded waves.
+MEMORY_BUDGET = 1 << 30
+
+
+def compact(values: np.ndarray) -> np.ndarray:
+    """
+    Returns values in the smallest type that holds them exactly: integer samples in 16 or
+    32 bits, float samples in 32 bits if none of them loses precision. Otherwise values are
+    returned as they are.
+    """
+    if values.size == 0 or values.dtype.itemsize <= 2:
+        return values
+    if np.issubdtype(values.dtype, np.integer):
+        lo, hi = values.min(), values.max()
+        for dtype in [np.int16, np.int32]:
+            if np.iinfo(dtype).min <= lo and hi <= np.iinfo(dtype).max:
+                return values.astype(dtype) if np.dtype(dtype).itemsize < values.dtype.itemsize else values
+        return values
+    if values.dtype == np.float64:
+        small = values.astype(np.float32)
+        if np.array_equal(small, values):
+            return small
+    return values
+
+
+class Registry(MutableMapping):
+    """
+    Loaded sound waves by name, holding at most budget bytes of decoded samples. Once over
+    the budget, the samples of the least recently used waves are released; those waves stay
+    registered and decode their samples from disk again on next use. Waves need to provide
+    nbytes() and release() for this, see SoundWave, and report changes of their samples
+    with decoded or resized, so the usage is kept as a running total.
+    """
+
+    def __init__(self, budget: int = MEMORY_BUDGET):
+        self.budget = budget
+        self.waves = OrderedDict()
+        # Bytes of each wave as last reported, and their total.
+        self.sizes = {}
+        self.total = 0
+
+    def __getitem__(self, name: str):
+        sw = self.waves[name]
+        self.waves.move_to_end(name)
+        return sw
+
+    def __setitem__(self, name: str, sw):
+        if name in self.waves:
+            del self[name]
+        self.waves[name] = sw
+        self.waves.move_to_end(name)
+        sw.compact()
+        self.sizes[name] = sw.nbytes()
+        self.total += self.sizes[name]
+        # Waves that don't hold any samples yet (like freshly loaded files) can't push the
+        # usage over the budget, and skipping them keeps registering many waves linear.
+        if self.sizes[name] > 0:
+            self.trim(keep=name)
+
+    def __delitem__(self, name: str):
+        del self.waves[name]
+        self.total -= self.sizes.pop(name)
+
+    def __iter__(self):
+        # A snapshot, so waves can be used (and moved to the end) while iterating.
+        return iter(list(self.waves))
+
+    def __len__(self) -> int:
+        return len(self.waves)
+
+    def peek(self, name: str):
+        """
+        Returns the wave without counting it as used.
+        """
+        return self.waves[name]
+
+    def decoded(self, sw):
+        """
+        Called by a wave once it holds newly decoded (or joined) samples. If it's registered,
+        least recently used waves are released right away, so a single command going over
+        many waves stays within the budget too, not only the next one.
+        """
+        if self.waves.get(sw.name, None) is sw:
+            self.resized(sw)
+            self.waves.move_to_end(sw.name)
+            self.trim(keep=sw.name)
+
+    def resized(self, sw):
+        """
+        Called by a wave once the bytes of samples it holds changed, like when its joined
+        segments are dropped. Only updates the usage, nothing is released.
+        """
+        if self.waves.get(sw.name, None) is sw:
+            size = sw.nbytes()
+            self.total += size - self.sizes[sw.name]
+            self.sizes[sw.name] = size
+
+    def usage(self) -> int:
+        """
+        Bytes of decoded samples currently held by all waves.
+        """
+        return self.total
+
+    def trim(self, keep: str = None) -> int:
+        """
+        Releases least recently used waves (except keep) until the usage fits the budget.
+        Returns the number of bytes released.
+        """
+        released = 0
+        if self.total <= self.budget:
+            return released
+        for name in list(self.waves):
+            if self.total <= self.budget:
+                break
+            if name == keep or self.sizes[name] == 0:
+                continue
+            sw = self.waves[name]
+            released += sw.release()
+            self.total += sw.nbytes() - self.sizes[name]
+            self.sizes[name] = sw.nbytes()
+        return released
@@ -0,0 +1,83 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+import os
+import threading
+import atomic
+import profiling
+
+
+# Directory rendered plots are written to.
+PLOT_DIR = "./output/plots"
+# File formats plots can be rendered to.
+FORMATS = ["png", "svg"]
+# Size (inches) and resolution of rendered plots.
+FIGSIZE = (12, 6)
+DPI = 100
+
+
+class RenderQueue:
+    """
+    Renders plots to image files on a background thread, so the caller never waits for
+    them. Figures are drawn with the Agg backend, without pyplot, so no window is needed.
+    Every plot is a file named after its request: a request for a plot that's already
+    rendered (or still rendering) is answered with that file instead of drawing it again.
+    """
+
+    def __init__(self, directory: str = PLOT_DIR):
+        self.directory = directory
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        # Path -> future of the plots still rendering.
+        self.pending: Dict[str, Future] = {}
+        # (path, error) of the plots finished since the last call of finished.
+        self.done: List[Tuple[str, Exception]] = []
+        self.lock = threading.Lock()
+
+    def path(self, name: str, key: str, format: str = "png") -> str:
+        return os.path.join(self.directory, f"{name}-{key[:16]}.{format}")
+
+    def submit(self, fpath: str, draw: Callable) -> bool:
+        """
+        Renders the figure draw(fig) draws to fpath, unless that file already exists or is
+        being rendered. Returns whether a new render was queued.
+        """
+        with self.lock:
+            if fpath in self.pending or os.path.exists(fpath):
+                return False
+            self.pending[fpath] = self.pool.submit(self._render, fpath, draw)
+            return True
+
+    def finished(self) -> List[Tuple[str, Exception]]:
+        """
+        Plots finished since the last call, as (path, None) or (path, error) if drawing failed.
+        """
+        with self.lock:
+            done, self.done = self.done, []
+        return done
+
+    def wait(self) -> int:
+        """
+        Waits for all queued plots to render. Returns how many there were.
+        """
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.exception()
+        return len(futures)
+
+    def _render(self, fpath: str, draw: Callable):
+        # Imported on the render thread, so loading matplotlib never holds up the prompt.
+        from matplotlib.figure import Figure
+
+        error = None
+        try:
+            with profiling.stage("render"):
+                fig = Figure(figsize=FIGSIZE, dpi=DPI)
+                draw(fig)
+                os.makedirs(self.directory, exist_ok=True)
+                with profiling.stage("render.save"), atomic.write(fpath) as f:
+                    fig.savefig(f, format=os.path.splitext(fpath)[1][1:])
+        except Exception as e:
+            error = e
+        with self.lock:
+            del self.pending[fpath]
+            self.done.append((fpath, error))
@@ -0,0 +1,131 @@
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+import numpy as np
+
+
+# Output samples resampled at once.
+CHUNK = 1 << 18
+# Half the length of the low-pass filter, per up- or downsampling step, as in resample_poly.
+HALF_TAPS = 10
+# Window the low-pass filter is designed with.
+WINDOW = ("kaiser", 5.0)
+
+
+def ratio(framerate: int, target: int) -> Tuple[int, int]:
+    """
+    Smallest up and down factors that turn framerate into target.
+    """
+    g = gcd(framerate, target)
+    return (target // g, framerate // g)
+
+
+@lru_cache(maxsize=32)
+def lowpass(up: int, down: int) -> np.ndarray:
+    """
+    Anti-aliasing filter of the polyphase resampler, the one scipy.signal.resample_poly
+    designs by default.
+    """
+    # Imported here, scipy.signal takes a while to load and is only needed when resampling.
+    from scipy.signal import firwin
+
+    rate = max(up, down)
+    h = firwin(2 * HALF_TAPS * rate + 1, 1 / rate, window=WINDOW)
+    h.flags.writeable = False
+    return h
+
+
+def block(values, up: int, down: int, start: int, stop: int) -> np.ndarray:
+    """
+    Samples [start, stop) of values resampled by up / down, as floats. Only the input samples
+    these depend on are read, so consecutive blocks join into exactly what resampling all of
+    values at once gives.
+    """
+    from scipy.signal import resample_poly
+
+    h = lowpass(up, down)
+    # Input samples each side of a block the filter reaches into, aligned to the polyphase
+    # period so output positions stay on the same phases.
+    pad = -(-((len(h) // 2) // up + 1) // down) * down
+    a, b = start // up * up, -(-stop // up) * up
+    lo, hi = a // up * down - pad, b // up * down + pad
+
+    # Samples beyond the wave are zeros, just like resample_poly pads them.
+    x = np.zeros((hi - lo,) + values.shape[1:])
+    x[max(0, -lo):min(hi, len(values)) - lo] = values[max(0, lo):min(hi, len(values))]
+    y = resample_poly(x, up, down, axis=0, window=np.array(h))
+    skip = pad * up // down
+    return y[skip + start - a:skip + stop - a]
+
+
+class Resampled:
+    """
+    Lazy resampling of samples (an array or another lazy source, like a Downmix) to another
+    frame rate with a polyphase filter. Only the indexed samples are computed, a chunk at a
+    time, so memory doesn't grow with the length of the wave. Samples keep their type.
+    """
+
+    def __init__(self, values, framerate: int, target: int):
+        self.values = values
+        self.up, self.down = ratio(framerate, target)
+        self.dtype = values.dtype
+        n = len(values) * self.up
+        self.shape = (n // self.down + bool(n % self.down),) + tuple(values.shape[1:])
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if start >= stop:
+                return np.zeros((0,) + self.shape[1:], dtype=self.dtype)
+            return self._cast(block(self.values, self.up, self.down, start, stop))[::step]
+        if key < 0:
+            key += len(self)
+        return self[key:key + 1][0]
+
+    def __array__(self, dtype=None, copy=None):
+        out = np.empty(self.shape, dtype=self.dtype)
+        for i in range(0, len(self), CHUNK):
+            out[i:i + CHUNK] = self[i:i + CHUNK]
+        return out if dtype is None else out.astype(dtype)
+
+    def _cast(self, y: np.ndarray) -> np.ndarray:
+        if np.issubdtype(self.dtype, np.integer):
+            info = np.iinfo(self.dtype)
+            return np.clip(np.rint(y), info.min, info.max).astype(self.dtype)
+        return y.astype(self.dtype)
+
+
+class ResampledWave:
+    """
+    Header of a WaveFile as seen at another frame rate. Sample positions at this rate map
+    back to the file with native.
+    """
+
+    def __init__(self, wav, framerate: int):
+        self.original = wav
+        self.framerate = framerate
+        self.up, self.down = ratio(wav.getframerate(), framerate)
+        n = wav.getnframes() * self.up
+        self.nframes = n // self.down + bool(n % self.down)
+
+    def getnchannels(self) -> int:
+        return self.original.getnchannels()
+
+    def getsampwidth(self) -> int:
+        return self.original.getsampwidth()
+
+    def getframerate(self) -> int:
+        return self.framerate
+
+    def getnframes(self) -> int:
+        return self.nframes
+
+    def native(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Sample positions at this rate as (the nearest) positions in the file.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        return np.minimum((positions * self.down + self.up // 2) // self.up, self.original.getnframes())
@@ -0,0 +1,323 @@
+"""
+Local analysis server. Accepts load/cut/analyse requests as JSON lines over a Unix socket
+(or a localhost TCP port) and answers every client concurrently. CPU work runs on a process
+pool. All clients share one registry of sound waves and one set of results: endpoints are
+found once per wave and P/R for both cut and analyse, and workers keep what they compute in
+the analysis cache, so a file is only decoded again for results that aren't there yet.
+
+    python server.py serve                          # listen on ./.soundwave.sock
+    python server.py serve --port 8765 --workers 4
+    python server.py call load name=male-alpha
+    python server.py call analyse name=male-alpha window_t=100
+"""
+from collections import OrderedDict
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import numpy as np
+import batch
+import cache
+import endpoints
+import main
+import stft
+import wavfile
+
+
+# Unix socket the server listens on by default.
+SOCKET_PATH = "./.soundwave.sock"
+# Longest request line accepted, in bytes.
+LINE_LIMIT = 1 << 20
+# Finished results kept in memory, least recently used ones are dropped first.
+MAX_RESULTS = 256
+
+
+def open_wave(name: str, path: str) -> main.SoundWave:
+    wav = wavfile.WaveFile(path)
+    return main.SoundWave(name, wav, wav.mono())
+
+
+def segments_job(name: str, path: str, p: int, r: int) -> np.ndarray:
+    """
+    Worker: speech segments of the wave, see SoundWave.clean.
+    """
+    return endpoints.segments(*open_wave(name, path).speech_runs(p, r))
+
+
+def spectrum_job(name: str, path: str, segments: np.ndarray, window_t: int, window_func: str) -> np.ndarray:
+    """
+    Worker: average spectrum of the wave as it is (cut down to segments, if given).
+    """
+    sw = open_wave(name, path)
+    if segments is not None:
+        sw.cut(segments)
+    return main.dft(sw, window_t, window_func) if sw.length > 0 else np.zeros(0)
+
+
+class Server:
+    """
+    Serves requests from any number of clients. Results are kept per wave, and a request
+    for a result that's still being computed waits for it instead of computing it again.
+    Up to max_results finished results are kept.
+    """
+
+    def __init__(self, workers: int = None, max_results: int = MAX_RESULTS):
+        self.pool = batch.pool(workers)
+        self.waves = main.sound_waves
+        self.max_results = max_results
+        # (op, name, ...) -> future of the result, least recently used first.
+        self.results: OrderedDict = OrderedDict()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads requests from a client connection. Each is answered as soon as it's done, so
+        replies may come out of order; they carry the id of their request.
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.reply(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def reply(self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock):
+        req = {}
+        try:
+            req = json.loads(line)
+            res = {"id": req.get("id", None), "ok": True, "result": await self.dispatch(req)}
+        except Exception as e:
+            res = {"id": req.get("id", None) if isinstance(req, dict) else None,
+                   "ok": False, "error": str(e) or type(e).__name__}
+        async with lock:
+            writer.write(json.dumps(res).encode() + b"\n")
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, req: dict):
+        op = req.get("op", None)
+        args = {k: v for k, v in req.items() if k not in ["op", "id"]}
+        if op == "ping":
+            return "pong"
+        if op == "list":
+            return self.list()
+        if op == "load":
+            return self.load(**args)
+        if op == "cut":
+            return await self.cut(**args)
+        if op == "uncut":
+            return self.uncut(**args)
+        if op == "analyse":
+            return await self.analyse(**args)
+        raise ValueError(f"Unknown operation: {op}")
+
+    def wave(self, name: str) -> main.SoundWave:
+        sw = self.waves.get(name, None)
+        if sw == None:
+            raise ValueError(f"Sound wave {name} isn't loaded")
+        if not isinstance(sw.wave, wavfile.WaveFile):
+            raise ValueError(f"Sound wave {name} isn't backed by a file")
+        return sw
+
+    def info(self, sw: main.SoundWave) -> dict:
+        return {"name": sw.name, "framerate": sw.wave.getframerate(), "nchannels": sw.wave.getnchannels(),
+                "frames": sw.length, "duration": sw.length / sw.wave.getframerate(),
+                "cleaned": sw.cleaned, "speech_detected": sw.speech_detected}
+
+    async def once(self, key: tuple, fn, *args):
+        """
+        Runs fn(*args) on the process pool, unless the result under key is already there
+        (or on its way). Failed results aren't kept.
+        """
+        future = self.results.get(key, None)
+        if future == None:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+            self.results[key] = future
+            # Results still being computed are never dropped, others are awaited below.
+            done = [k for k, f in self.results.items() if f.done()]
+            for k in done[:max(0, len(self.results) - self.max_results)]:
+                del self.results[k]
+        else:
+            self.results.move_to_end(key)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if self.results.get(key, None) is future:
+                del self.results[key]
+            raise
+
+    def list(self) -> list:
+        return [self.info(sw) for sw in self.waves.values()]
+
+    def load(self, name: str, path: str = None) -> dict:
+        """
+        Registers the wave from path (./input/<name>.wav by default). Only the header is read.
+        """
+        sw = self.waves.get(name, None)
+        if sw != None and path == None:
+            return self.info(sw)
+        wav = wavfile.WaveFile(path or f"./input/{name}.wav")
+        self.waves[name] = main.SoundWave(name, wav, wav.mono())
+        self.results = OrderedDict((k, v) for k, v in self.results.items() if k[1] != name)
+        return self.info(self.waves[name])
+
+    async def cut(self, name: str, p: int = main.p, r: int = main.r) -> dict:
+        sw = self.wave(name)
+        segments = await self.once(("segments", name, p, r), segments_job, name, sw.wave.path, p, r)
+        sw.uncut()
+        sw.cut(segments)
+        res = self.info(sw)
+        res["segments"] = segments.tolist()
+        res["borders"] = endpoints.borders(segments, sw.wave.getframerate())
+        return res
+
+    def uncut(self, name: str) -> dict:
+        sw = self.wave(name)
+        sw.uncut()
+        return self.info(sw)
+
+    async def analyse(
+            self,
+            name: str,
+            p: int = main.p,
+            r: int = main.r,
+            window_t: int = 100,
+            window_func: str = "none",
+            spectrum: bool = True) -> dict:
+        """
+        Endpoints, speech flag and average spectrum of the wave, as it currently is. The
+        endpoints are the same result cut uses.
+        """
+        sw = self.wave(name)
+        window_func = str(window_func).lower()
+        if window_func not in stft.WINDOW_FUNCS:
+            raise ValueError(f"window_func can only be one of {stft.WINDOW_FUNCS}")
+        segments = await self.once(("segments", name, p, r), segments_job, name, sw.wave.path, p, r)
+        res = self.info(sw)
+        res["borders"] = endpoints.borders(segments, sw.wave.getframerate())
+        res["speech_detected"] = len(segments) > 0
+        if spectrum:
+            state = None if sw.segments is None else cache.array_digest(sw.segments)
+            spec = await self.once(
+                ("spectrum", name, state, window_t, window_func), spectrum_job,
+                name, sw.wave.path, sw.segments, window_t, window_func)
+            N = int(sw.wave.getframerate() * window_t / 1000)
+            res["freqs"] = (sw.wave.getframerate() * np.arange(len(spec)) / N).tolist()
+            res["spectrum"] = spec.tolist()
+        return res
+
+    async def serve(self, path: str = SOCKET_PATH, port: int = None):
+        if port != None:
+            server = await asyncio.start_server(self.handle, "127.0.0.1", port, limit=LINE_LIMIT)
+            print(f"🚀 Listening on 127.0.0.1:{port}")
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.handle, path, limit=LINE_LIMIT)
+            print(f"🚀 Listening on {path}")
+        sys.stdout.flush()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            if port == None and os.path.exists(path):
+                os.remove(path)
+
+
+class Client:
+    """
+    Blocking client of the analysis server. The address is a Unix socket path or host:port.
+    """
+
+    def __init__(self, address: str = SOCKET_PATH):
+        host, _, port = address.rpartition(":")
+        if port.isdigit():
+            self.sock = socket.create_connection((host or "127.0.0.1", int(port)))
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+        self.file = self.sock.makefile("rb")
+        self.next_id = 0
+
+    def call(self, op: str, **args):
+        """
+        Sends a request and waits for its result. Raises RuntimeError if the request failed.
+        """
+        self.next_id += 1
+        self.sock.sendall(json.dumps(dict(args, op=op, id=self.next_id)).encode() + b"\n")
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("Server closed the connection")
+            res = json.loads(line)
+            if res["id"] == self.next_id:
+                break
+        if not res["ok"]:
+            raise RuntimeError(res["error"])
+        return res["result"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def main_server(argv=None):
+    parser = argparse.ArgumentParser(description="Local analysis server.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run the server")
+    serve.add_argument("--socket", default=SOCKET_PATH, help="Unix socket to listen on")
+    serve.add_argument("--port", type=int, default=None, help="listen on this localhost port instead")
+    serve.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    call = sub.add_parser("call", help="send a single request to a running server")
+    call.add_argument("--address", default=SOCKET_PATH, help="Unix socket path or host:port")
+    call.add_argument("op", help="ping, list, load, cut, uncut or analyse")
+    call.add_argument("args", nargs="*", help="arguments as key=value")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(Server(args.workers).serve(args.socket, args.port))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    kwargs = {}
+    for x in args.args:
+        k, _, v = x.partition("=")
+        try:
+            kwargs[k] = json.loads(v)
+        except ValueError:
+            kwargs[k] = v
+    with Client(args.address) as client:
+        try:
+            print(json.dumps(client.call(args.op, **kwargs), indent=2))
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_server())
@@ -0,0 +1,70 @@
+from functools import lru_cache
+import numpy as np
+
+
+# Number of frames transformed at once, bounds the memory of a single FFT call.
+BLOCK_FRAMES = 512
+
+WINDOW_FUNCS = ["none", "hamming", "hanning"]
+
+
+@lru_cache(maxsize=32)
+def window(N: int, window_func: str) -> np.ndarray:
+    """
+    Window of N samples for the given window function. Cached per (N, window_func).
+    """
+    if window_func == "hamming":
+        w = np.hamming(N)
+    elif window_func == "hanning":
+        w = np.hanning(N)
+    elif window_func == "none":
+        w = np.ones(N)
+    else:
+        raise ValueError(
+            "window_func argument can only be one of [\"none\", \"hamming\", \"hanning\"]")
+    w.flags.writeable = False
+    return w
+
+
+def frames(values: np.ndarray, N: int, hop: int = None) -> np.ndarray:
+    """
+    Splits values into frames of N samples, hop samples apart (N by default), as a 2-D
+    strided view without copying. A trailing partial frame is dropped, but values shorter
+    than N are zero-padded into a single frame.
+    """
+    if hop is None:
+        hop = N
+    if len(values) < N:
+        values = np.pad(values, (0, N - len(values)))
+    return np.lib.stride_tricks.sliding_window_view(values, N)[::hop]
+
+
+def spectra(values: np.ndarray, N: int, window_func: str = "none", hop: int = None) -> np.ndarray:
+    """
+    Magnitude spectrum of every frame, as an (n_frames, N // 2) array. Magnitudes are
+    normalized by N, with all bins but DC doubled to account for the cut negative half.
+    """
+    fr = frames(values, N, hop)
+    w = window(N, window_func)
+    out = np.empty((len(fr), N // 2))
+    for i in range(0, len(fr), BLOCK_FRAMES):
+        out[i:i + BLOCK_FRAMES] = _magnitudes(fr[i:i + BLOCK_FRAMES], w, N)
+    return out
+
+
+def average(values: np.ndarray, N: int, window_func: str = "none", hop: int = None) -> np.ndarray:
+    """
+    Average magnitude spectrum over all frames, see spectra.
+    """
+    fr = frames(values, N, hop)
+    w = window(N, window_func)
+    total = np.zeros(N // 2)
+    for i in range(0, len(fr), BLOCK_FRAMES):
+        total += _magnitudes(fr[i:i + BLOCK_FRAMES], w, N).sum(axis=0)
+    return total / len(fr)
+
+
+def _magnitudes(fr: np.ndarray, w: np.ndarray, N: int) -> np.ndarray:
+    y = np.fft.rfft(fr * w, axis=1)[:, :N // 2] / N
+    y[:, 1:] *= 2
+    return np.abs(y)
@@ -0,0 +1,102 @@
+from collections import deque
+from typing import List
+import numpy as np
+import atomic
+import endpoints
+import wavfile
+
+
+# Default number of frames read from the file at once.
+CHUNK_FRAMES = 1 << 16
+
+
+class SampleQueue:
+    """
+    FIFO of samples waiting for the hangover filter to decide whether they are speech.
+    """
+
+    def __init__(self):
+        self.chunks = deque()
+        self.offset = 0
+        self.size = 0
+
+    def push(self, values: np.ndarray):
+        if len(values) > 0:
+            self.chunks.append(values)
+            self.size += len(values)
+
+    def pop(self, n: int) -> List[np.ndarray]:
+        """
+        Removes the first n samples from the queue. Returns them as views of the pushed arrays.
+        """
+        out = []
+        self.size -= n
+        while n > 0:
+            head = self.chunks[0]
+            take = min(n, len(head) - self.offset)
+            out.append(head[self.offset:self.offset + take])
+            self.offset += take
+            n -= take
+            if self.offset == len(head):
+                self.chunks.popleft()
+                self.offset = 0
+        return out
+
+
+def clean_stream(src: str, dst: str, p: int, r: int, chunk_frames: int = CHUNK_FRAMES):
+    """
+    Removes non-speech parts of the wave at path src and writes the speech to path dst,
+    reading the file in chunks of chunk_frames frames. Output equals SoundWave.clean, in the
+    sample format of the source, but peak memory doesn't depend on the length of the file.
+    Returns the number of frames read and the number of frames written.
+    """
+    wav = wavfile.WaveFile(src)
+    framerate = wav.getframerate()
+    sampwidth = wav.getsampwidth()
+
+    window_w = endpoints.window_width(framerate)
+    initial_t = round(framerate * endpoints.INITIAL_T / 1000)
+
+    # Chunks must hold whole noise detection windows and the first one must be long
+    # enough to estimate the noise limit.
+    chunk_frames = max(chunk_frames, initial_t)
+    chunk_frames = -(-chunk_frames // window_w) * window_w
+
+    hangover = endpoints.HangoverFilter(p, r)
+    queue = SampleQueue()
+    noise_l = None
+    read = 0
+    written = 0
+
+    # The header is completed once the length is known.
+    with atomic.write(dst) as out:
+        wavfile.write_header(out, 0, 1, framerate, sampwidth, wav.format)
+        while True:
+            vals = wavfile.downmix(wav.samples(read, read + chunk_frames))
+            if len(vals) == 0:
+                runs = hangover.finish()
+            else:
+                if noise_l is None:
+                    noise_l = endpoints.noise_limit(vals, framerate)
+                read += len(vals)
+                queue.push(vals)
+
+                energies = endpoints.frame_energies(vals, window_w)
+                frame_l = np.full(len(energies), window_w, dtype=np.int64)
+                frame_l[-1] = len(vals) - window_w * (len(energies) - 1)
+                flags, lengths = endpoints.run_lengths(energies > noise_l, frame_l)
+                runs = [x for f, l in zip(flags, lengths)
+                        for x in hangover.push(bool(f), int(l))]
+
+            for speech, length in runs:
+                for view in queue.pop(length):
+                    if speech:
+                        out.write(wavfile.encode(view, sampwidth, wav.format))
+                        written += len(view)
+
+            if len(vals) == 0:
+                break
+
+        out.seek(0)
+        wavfile.write_header(out, written, 1, framerate, sampwidth, wav.format)
+    return (read, written)
@@ -0,0 +1,85 @@
+from typing import Iterator, Tuple
+import numpy as np
+import atomic
+import wavfile
+
+
+# Sample formats generated waves can be written in: name -> (format tag, sample width).
+FORMATS = {
+    "int16": (wavfile.WAVE_FORMAT_PCM, 2),
+    "int32": (wavfile.WAVE_FORMAT_PCM, 4),
+    "float32": (wavfile.WAVE_FORMAT_IEEE_FLOAT, 4),
+}
+# Number of frames synthesized and written at once.
+CHUNK_FRAMES = 1 << 14
+# Number of harmonics summed at once, bounds the memory of a single chunk.
+HARMONICS_BLOCK = 64
+
+
+def harmonics(n: int, seed: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draws n random harmonics: amplitudes between 0.1 and 1, integer frequencies between 10
+    and 100 Hz. The same seed always gives the same harmonics.
+    """
+    rng = np.random.default_rng(seed)
+    amps = rng.integers(1, 11, n) / 10
+    freqs = rng.integers(10, 101, n)
+    return (amps, freqs)
+
+
+def synthesize(amps: np.ndarray, freqs: np.ndarray, framerate: int, start: int, stop: int) -> np.ndarray:
+    """
+    Sum of the harmonics over frames [start, stop), as float64. Phases are reduced exactly
+    in integers (the frequencies are whole numbers), so they don't lose precision however
+    far into the wave the frames are.
+    """
+    k = np.arange(start, stop, dtype=np.int64)
+    out = np.zeros(stop - start)
+    for i in range(0, len(freqs), HARMONICS_BLOCK):
+        f = freqs[i:i + HARMONICS_BLOCK].astype(np.int64)
+        phase = np.outer(f, k) % framerate
+        out += amps[i:i + HARMONICS_BLOCK] @ np.sin(phase * (2 * np.pi / framerate))
+    return out
+
+
+def period(amps: np.ndarray, freqs: np.ndarray, framerate: int) -> np.ndarray:
+    """
+    The first second (framerate frames) of the sum of the harmonics, synthesized in chunks.
+    """
+    out = np.empty(framerate)
+    for start in range(0, framerate, CHUNK_FRAMES):
+        stop = min(framerate, start + CHUNK_FRAMES)
+        out[start:stop] = synthesize(amps, freqs, framerate, start, stop)
+    return out
+
+
+def chunks(amps: np.ndarray, freqs: np.ndarray, framerate: int, nframes: int, format: str) -> Iterator[np.ndarray]:
+    """
+    Yields the wave chunk by chunk, scaled to the full range of the given sample format.
+    The sum of the amplitudes bounds the peak, so samples never clip.
+    """
+    # All frequencies are whole numbers, so the wave repeats every second: only that second
+    # is synthesized, however long the wave is.
+    one = period(amps, freqs, framerate) / max(float(amps.sum()), 1e-12)
+    for start in range(0, nframes, CHUNK_FRAMES):
+        vals = one[np.arange(start, min(nframes, start + CHUNK_FRAMES)) % framerate]
+        if format == "float32":
+            yield vals.astype("<f4")
+        else:
+            full = np.iinfo(np.int16 if format == "int16" else np.int32).max
+            yield np.round(vals * full).astype("<i2" if format == "int16" else "<i4")
+
+
+def write(fpath: str, amps: np.ndarray, freqs: np.ndarray, framerate: int, nframes: int, format: str = "int32"):
+    """
+    Streams the wave into a mono .wav file in the given sample format, one chunk at a time.
+    An existing file is only replaced once the new one is complete, so waves still mapping
+    the old one keep reading it.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Sample format can only be one of {list(FORMATS)}")
+    tag, sampwidth = FORMATS[format]
+    with atomic.write(fpath) as f:
+        wavfile.write_header(f, nframes, 1, framerate, sampwidth, tag)
+        for vals in chunks(amps, freqs, framerate, nframes, format):
+            f.write(vals.tobytes())
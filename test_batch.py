@@ -0,0 +1,79 @@
+"""
+Checks that cutting on the process pool goes through the analysis cache, and that the
+cache copes with entries evicted by other workers. Run with python -m pytest.
+"""
+import glob
+import os
+import numpy as np
+import pytest
+import batch
+import cache
+import endpoints
+import main
+import wavfile
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+FILES = sorted(glob.glob(os.path.join(INPUT_DIR, "*.wav")))[:4]
+
+
+def test_pooled_cut_hits_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(str(tmp_path / "cache")))
+    jobs = [(os.path.basename(x)[:-4], x) for x in FILES]
+
+    first, errors = batch.run(jobs, main.p, main.r, workers=2)
+    assert errors == {}
+    entries = glob.glob(str(tmp_path / "cache" / "*.npz"))
+    assert len(entries) == len(jobs)
+
+    # Detection must not run again: every wave is answered from the cache, no entry is
+    # written anew.
+    inodes = {x: os.stat(x).st_ino for x in entries}
+    second, errors = batch.run(jobs, main.p, main.r, workers=2)
+    assert errors == {}
+    assert {x: os.stat(x).st_ino for x in entries} == inodes
+    for name, _ in jobs:
+        assert np.array_equal(first[name].segments, second[name].segments)
+
+
+def test_entry_evicted_while_read_is_computed(tmp_path, monkeypatch):
+    store = cache.Cache(str(tmp_path / "cache"))
+    store.array("k", lambda: np.arange(3))
+    store.arrays("ks", lambda: {"a": np.arange(3)})
+
+    # Another process evicts the entries between finding and reading them.
+    load = np.load
+    def evicted(fpath, *args, **kwargs):
+        os.remove(fpath)
+        return load(fpath, *args, **kwargs)
+    monkeypatch.setattr(cache.np, "load", evicted)
+    assert np.array_equal(store.array("k", lambda: np.arange(4)), np.arange(4))
+    assert np.array_equal(store.arrays("ks", lambda: {"a": np.arange(4)})["a"], np.arange(4))
+
+
+def test_file_digests_shared_between_caches(tmp_path, monkeypatch):
+    first = cache.Cache(str(tmp_path / "cache"))
+    digests = [first.file_digest(x) for x in FILES]
+
+    # Another process with its own Cache finds the digests without hashing the files again.
+    def fail(*args, **kwargs):
+        raise AssertionError("file was hashed again")
+    monkeypatch.setattr(cache.hashlib, "blake2b", fail)
+    second = cache.Cache(str(tmp_path / "cache"))
+    assert [second.file_digest(x) for x in FILES] == digests
+
+
+def test_warm_cache_never_decodes(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(str(tmp_path / "cache")))
+    name = os.path.basename(FILES[0])[:-4]
+    first = main.load_wave(name, directory=INPUT_DIR)
+    spectrum = main.dft(first, window_t=100, window_func="hamming")
+
+    # Keying the cache by the file must not decode the (lazy) samples of the wave.
+    def fail(*args, **kwargs):
+        raise AssertionError("the wave was decoded")
+    monkeypatch.setattr(wavfile.Downmix, "__array__", fail)
+    monkeypatch.setattr(wavfile.Channel, "__array__", fail)
+    sw = main.load_wave(name, directory=INPUT_DIR)
+    assert sw.digest() == first.digest()
+    assert np.array_equal(main.dft(sw, window_t=100, window_func="hamming"), spectrum)
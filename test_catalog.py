@@ -0,0 +1,36 @@
+"""
+Checks that list shows the same status it filters by, the one recorded in the catalog.
+Run with python -m pytest.
+"""
+import os
+import cache
+import catalog
+import main
+import registry
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+NAME = "male-delta"
+
+
+def test_list_status_matches_filter(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(enabled=False))
+    corpus = catalog.Catalog(str(tmp_path / "catalog.sqlite"))
+    monkeypatch.setattr(main, "corpus", corpus)
+    corpus.scan("./input")
+    # Cut in an earlier session, loaded again (uncut) in this one.
+    corpus.record([(f"./input/{NAME}.wav", True, 2)], main.p, main.r)
+    d = registry.Registry()
+    d[NAME] = main.load_wave(NAME)
+
+    main.list_waves(d, ["speech"])
+    lines = [x for x in capsys.readouterr().out.splitlines() if x.startswith("▶️")]
+    assert len(lines) == 1
+    assert NAME in lines[0] and "Speech found" in lines[0] and "Cut" not in lines[0]
+
+    d[NAME].clean(main.p, main.r)
+    main.list_waves(d, ["speech"])
+    lines = [x for x in capsys.readouterr().out.splitlines() if x.startswith("▶️")]
+    assert "Speech found" in lines[0] and "Cut" in lines[0]
+    corpus.close()
@@ -0,0 +1,81 @@
+"""
+Checks the vectorized endpoint detection against the loop-based reference on every file in
+./input. Run with python -m pytest.
+"""
+import glob
+import os
+import numpy as np
+import pytest
+import cache
+import endpoints
+import main
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+FILES = sorted(os.path.basename(x)[:-4] for x in glob.glob(os.path.join(INPUT_DIR, "*.wav")))
+# (P, R) pairs: the defaults, no hangover at all, a hangover on one side only, and P and R
+# longer than any of the signals.
+PARAMS = [(500, 5000), (0, 0), (1, 0), (0, 1), (500, 0), (0, 5000), (100, 100000),
+          (10 ** 7, 0), (0, 10 ** 7), (10 ** 7, 10 ** 7)]
+
+_waves = {}
+
+
+def wave(name: str) -> main.SoundWave:
+    if name not in _waves:
+        _waves[name] = main.load_wave(name, directory=INPUT_DIR)
+    return _waves[name]
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    # Results must be computed, not read from (or left in) the cache of earlier runs.
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(enabled=False))
+
+
+@pytest.mark.parametrize("p,r", PARAMS, ids=[f"p{p}-r{r}" for p, r in PARAMS])
+@pytest.mark.parametrize("name", FILES)
+def test_find_endpoints_matches_reference(name, p, r):
+    sw = wave(name)
+    mask, borders = sw.find_endpoints(p, r)
+    ref_mask, ref_borders = sw.find_endpoints_reference(p, r)
+    assert np.array_equal(mask, ref_mask)
+    assert borders == ref_borders
+
+
+def test_input_files_found():
+    assert len(FILES) > 0
+
+
+def test_window_of_cut_wave_stays_lazy():
+    source = wave("male-alpha").source
+    segs = endpoints.segments(*wave("male-alpha").speech_runs(main.p, main.r))
+    sw = main.load_wave("male-alpha", directory=INPUT_DIR)
+    sw.cut(segs)
+    y = sw.window(1000, 2000)
+    # Only the window is decoded, not the whole downmix of the file.
+    assert not isinstance(sw._source, np.ndarray)
+    assert np.array_equal(y, np.concatenate([source[a:b] for a, b in segs])[1000:2000])
+
+
+@pytest.mark.parametrize("p,r", PARAMS[:4], ids=[f"p{p}-r{r}" for p, r in PARAMS[:4]])
+def test_batch_segments_match_speech_runs(p, r, monkeypatch):
+    # Small batches, so the rows are spread over several of them.
+    monkeypatch.setattr(main, "BATCH_SAMPLES", 1 << 20)
+    waves = [wave(name) for name in FILES]
+    found = main.batch_segments(waves, p, r)
+    per_channel = main.batch_segments(waves, p, r, channels=True)
+    for sw in waves:
+        assert len(found[sw.name]) == 1
+        assert np.array_equal(found[sw.name][0], endpoints.segments(*sw.speech_runs(p, r)))
+        fr = sw.wave.getframerate()
+        channels = sw.file().samples()
+        assert len(per_channel[sw.name]) == channels.shape[1]
+        for x, segs in zip(channels.T, per_channel[sw.name]):
+            assert np.array_equal(segs, endpoints.segments(*endpoints.speech_runs(x, fr, p, r)))
+
+
+@pytest.mark.parametrize("name", FILES[:3])
+def test_borders_match_find_endpoints(name):
+    sw = wave(name)
+    assert sw.borders(main.p, main.r) == sw.find_endpoints(main.p, main.r)[1]
@@ -0,0 +1,77 @@
+"""
+Checks that export writes exactly the speech of the waves, with a manifest, and that a
+failed write leaves nothing behind. Run with python -m pytest.
+"""
+import csv
+import json
+import os
+import wave
+import numpy as np
+import pytest
+import cache
+import endpoints
+import export
+import main
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+NAMES = ["male-alpha", "male-bravo", "noise-gunfire"]
+
+
+@pytest.fixture
+def out(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(enabled=False))
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path / "output"))
+    return tmp_path / "output"
+
+
+@pytest.mark.parametrize("fmt", export.FORMATS)
+def test_export_writes_speech_and_manifest(out, fmt):
+    waves = [main.load_wave(name, directory=INPUT_DIR) for name in NAMES]
+    expected = [endpoints.segments(*sw.speech_runs(main.p, main.r)) for sw in waves]
+    # Cut waves export their segments, uncut ones those cut would keep: the same.
+    waves[0].clean(main.p, main.r)
+    manifest = str(out / f"manifest.{fmt}")
+    rows = main.export_waves(waves, manifest, 2)
+
+    for sw, row, segs in zip(waves, rows, expected):
+        source = np.asarray(sw.source)
+        assert row["segments"] == segs.tolist()
+        assert row["speech_detected"] == (len(segs) > 0)
+        if len(segs) == 0:
+            assert row["output"] is None
+            continue
+        with wave.open(row["output"]) as w:
+            assert w.getnchannels() == 1
+            assert w.getframerate() == sw.wave.getframerate()
+            y = np.frombuffer(w.readframes(w.getnframes()), "<i2")
+        assert np.array_equal(y, np.concatenate([source[a:b] for a, b in segs]))
+
+    if fmt == "json":
+        with open(manifest) as f:
+            assert [x["name"] for x in json.load(f)] == NAMES
+    else:
+        with open(manifest, newline="") as f:
+            assert [x["name"] for x in csv.DictReader(f)] == NAMES
+    assert not [x for x in os.listdir(out) if x.endswith(".tmp")]
+
+
+class Failing:
+    """
+    Source that fails after the first chunk, like a file that's gone while exporting.
+    """
+    dtype = np.dtype(np.int16)
+
+    def __getitem__(self, key):
+        if key.start > 0:
+            raise OSError("read failed")
+        return np.zeros(key.stop - key.start, dtype=np.int16)
+
+
+def test_failed_write_leaves_nothing(out):
+    os.makedirs(out)
+    fpath = str(out / "failing-cut.wav")
+    segs = np.array([[0, 3 * export.CHUNK_FRAMES]])
+    written, errors = export.write_all([("failing", fpath, Failing(), segs, 48000, 2)])
+    assert written == {} and errors == {"failing": "read failed"}
+    assert os.listdir(out) == []
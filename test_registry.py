@@ -0,0 +1,53 @@
+"""
+Checks that the registry keeps its running usage in step with the waves and stays within
+its budget. Run with python -m pytest.
+"""
+import glob
+import os
+import numpy as np
+import pytest
+import cache
+import main
+import registry
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+FILES = sorted(os.path.basename(x)[:-4] for x in glob.glob(os.path.join(INPUT_DIR, "*.wav")))[:8]
+
+
+@pytest.fixture
+def waves(monkeypatch):
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(enabled=False))
+    d = registry.Registry(1 << 20)
+    monkeypatch.setattr(main, "sound_waves", d)
+    for name in FILES:
+        d[name] = main.load_wave(name, directory=INPUT_DIR)
+    return d
+
+
+def actual(d: registry.Registry) -> int:
+    return sum(sw.nbytes() for sw in d.waves.values())
+
+
+def test_usage_follows_decode_cut_and_release(waves):
+    assert waves.usage() == 0
+    for name in FILES:
+        waves[name].values
+        assert waves.usage() == actual(waves)
+        # The wave just decoded is kept, older ones are released to fit the budget.
+        assert waves.usage() <= max(waves.budget, waves.peek(name).nbytes())
+
+    for name in FILES[:4]:
+        waves[name].clean(main.p, main.r)
+        waves[name].values
+        assert waves.usage() == actual(waves)
+    waves.peek(FILES[0]).uncut()
+    assert waves.usage() == actual(waves)
+
+    del waves[FILES[1]]
+    waves[FILES[2]] = main.SoundWave(FILES[2], None, np.zeros(1000, dtype=np.int16))
+    assert waves.usage() == actual(waves)
+    # Generated samples can't be read from disk again, so only they stay.
+    waves.budget = 0
+    waves.trim()
+    assert waves.usage() == actual(waves) == 2000
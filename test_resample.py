@@ -0,0 +1,67 @@
+"""
+Checks the lazy polyphase resampler against a one-shot scipy.signal.resample_poly, however
+it's chunked or sliced, and the mapping of resampled positions back to the file. Run with
+python -m pytest.
+"""
+import os
+import numpy as np
+import pytest
+import resample
+import wavfile
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+# (native rate, target rate): down, up, and an odd ratio.
+RATES = [(48000, 16000), (16000, 44100), (44100, 16000), (48000, 44100)]
+
+
+def reference(x: np.ndarray, framerate: int, target: int) -> np.ndarray:
+    from scipy.signal import resample_poly
+
+    up, down = resample.ratio(framerate, target)
+    return resample_poly(x.astype(np.float64), up, down, axis=0)
+
+
+@pytest.mark.parametrize("framerate,target", RATES, ids=[f"{a}-{b}" for a, b in RATES])
+def test_chunked_equals_one_shot(framerate, target, monkeypatch):
+    # Small chunks, so the whole wave is put together from many blocks.
+    monkeypatch.setattr(resample, "CHUNK", 1000)
+    x = np.random.default_rng(0).uniform(-1, 1, size=12345)
+    y = resample.Resampled(x, framerate, target)
+    want = reference(x, framerate, target)
+
+    assert len(y) == len(want)
+    assert np.allclose(np.asarray(y), want, atol=1e-9)
+    for a, b in [(0, 1), (17, 4000), (len(y) - 5, len(y)), (3000, 2000)]:
+        assert np.allclose(y[a:b], want[a:b], atol=1e-9)
+    assert np.allclose(y[::7], want[::7], atol=1e-9)
+    assert np.isclose(y[-1], want[-1], atol=1e-9)
+
+
+def test_lazy_source_keeps_type():
+    wav = wavfile.WaveFile(os.path.join(INPUT_DIR, "male-alpha.wav"))
+    y = resample.Resampled(wav.mono(), wav.getframerate(), 16000)
+    want = reference(np.asarray(wav.mono()), wav.getframerate(), 16000)
+    out = np.asarray(y)
+    assert out.dtype == wav.dtype and len(out) == len(want)
+    # Integer samples are rounded to the nearest value.
+    assert np.abs(out - np.clip(want, -32768, 32767)).max() <= 0.5 + 1e-6
+
+
+@pytest.mark.parametrize("framerate,target", RATES, ids=[f"{a}-{b}" for a, b in RATES])
+def test_native_positions(framerate, target):
+    class Header:
+        def getframerate(self):
+            return framerate
+
+        def getnframes(self):
+            return 12345
+
+    rw = resample.ResampledWave(Header(), target)
+    assert rw.getnframes() == len(reference(np.zeros(12345), framerate, target))
+    positions = np.arange(rw.getnframes() + 1)
+    native = rw.native(positions)
+    # The nearest position in the file, in time, never past its end.
+    want = np.minimum(np.floor(positions * framerate / target + 0.5), 12345)
+    assert np.array_equal(native, want)
+    assert native[0] == 0 and native[-1] == 12345
@@ -0,0 +1,132 @@
+"""
+Checks the analysis server end to end: a server on a temporary Unix socket, answered by
+the blocking client. Run with python -m pytest.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import time
+import pytest
+import cache
+import main
+import registry
+import server
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+NAME = "male-alpha"
+PATH = os.path.join(INPUT_DIR, f"{NAME}.wav")
+
+
+@pytest.fixture
+def running(tmp_path, monkeypatch):
+    """
+    A server listening on a socket in tmp_path, on an event loop of its own thread. Yields
+    the server and the socket path.
+    """
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(str(tmp_path / "cache")))
+    srv = server.Server(workers=2)
+    srv.waves = registry.Registry()
+    sock = str(tmp_path / "server.sock")
+    started = {}
+
+    async def serve():
+        started["loop"] = asyncio.get_running_loop()
+        started["task"] = asyncio.current_task()
+        try:
+            await srv.serve(sock)
+        except asyncio.CancelledError:
+            pass
+
+    # asyncio.run also finishes the connections still open once serving stops.
+    thread = threading.Thread(target=asyncio.run, args=(serve(),), daemon=True)
+    thread.start()
+    for _ in range(500):
+        if os.path.exists(sock):
+            break
+        time.sleep(0.01)
+    yield srv, sock
+    started["loop"].call_soon_threadsafe(started["task"].cancel)
+    thread.join(timeout=30)
+
+
+def test_load_cut_analyse_uncut(running):
+    _, sock = running
+    with server.Client(sock) as client:
+        assert client.call("ping") == "pong"
+        info = client.call("load", name=NAME, path=PATH)
+        assert info["name"] == NAME and not info["cleaned"]
+        frames = info["frames"]
+
+        cut = client.call("cut", name=NAME)
+        assert cut["cleaned"] and 0 < cut["frames"] < frames
+        assert cut["frames"] == sum(b - a for a, b in cut["segments"])
+
+        res = client.call("analyse", name=NAME, window_t=50, window_func="hamming")
+        assert res["borders"] == cut["borders"] and res["speech_detected"]
+        assert len(res["spectrum"]) == len(res["freqs"]) > 0
+
+        info = client.call("uncut", name=NAME)
+        assert not info["cleaned"] and info["frames"] == frames
+        assert [x["name"] for x in client.call("list")] == [NAME]
+
+
+def test_concurrent_cuts_share_one_result(running):
+    srv, sock = running
+    with server.Client(sock) as client:
+        client.call("load", name=NAME, path=PATH)
+
+    # Every job sent to the pool is counted.
+    jobs = []
+    submit = srv.pool.submit
+    def counting(fn, *args, **kwargs):
+        jobs.append(fn.__name__)
+        return submit(fn, *args, **kwargs)
+    srv.pool.submit = counting
+
+    start = threading.Barrier(8)
+    def cut(_):
+        with server.Client(sock) as client:
+            start.wait()
+            return client.call("cut", name=NAME, p=400, r=4000)["segments"]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(cut, range(8)))
+
+    assert jobs == ["segments_job"]
+    assert all(x == results[0] for x in results)
+    assert len(results[0]) > 0
+
+
+def test_unknown_window_func(running):
+    _, sock = running
+    with server.Client(sock) as client:
+        client.call("load", name=NAME, path=PATH)
+        with pytest.raises(RuntimeError, match="window_func can only be one of"):
+            client.call("analyse", name=NAME, window_func="nope")
+        # The connection is still good after the error.
+        assert client.call("ping") == "pong"
+    with pytest.raises(RuntimeError, match="isn't loaded"):
+        with server.Client(sock) as client:
+            client.call("analyse", name="missing")
+
+
+def test_eviction_keeps_pending_results():
+    srv = server.Server(workers=2, max_results=1)
+
+    async def run():
+        slow = asyncio.ensure_future(srv.once(("slow",), time.sleep, 1))
+        await asyncio.sleep(0)
+        for i in range(4):
+            assert await srv.once(("fast", i), abs, -i) == i
+            # Finished results are dropped beyond max_results, the pending one never.
+            assert not srv.results[("slow",)].done()
+            assert len([f for f in srv.results.values() if f.done()]) <= srv.max_results
+        assert await slow is None
+        # The slow result is still there, and is answered without running again.
+        assert await srv.once(("slow",), pytest.fail, "ran again") is None
+
+    try:
+        asyncio.run(run())
+    finally:
+        srv.pool.shutdown()
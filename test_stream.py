@@ -0,0 +1,62 @@
+"""
+Checks that the streaming cut writes exactly the file SoundWave.clean would give, whatever
+the chunk size. Run with python -m pytest.
+"""
+import glob
+import io
+import os
+import numpy as np
+import pytest
+import cache
+import main
+import stream
+import synth
+import wavfile
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+FILES = sorted(glob.glob(os.path.join(INPUT_DIR, "*.wav")))[::4]
+# Frames read at once: less than the noise estimate needs, not a multiple of the detection
+# window, a few windows, and the whole file.
+CHUNKS = [1, 4801, 20000, 10 ** 8]
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(enabled=False))
+
+
+def expected(src: str, p: int, r: int) -> bytes:
+    """
+    Bytes of the .wav SoundWave.clean gives, written in the sample format of the source.
+    """
+    sw = main.load_wave(os.path.basename(src)[:-4], directory=os.path.dirname(src))
+    sw.clean(p, r)
+    wav = sw.wave
+    out = wavfile.encode(np.asarray(sw.values), wav.getsampwidth(), wav.format)
+    header = io.BytesIO()
+    wavfile.write_header(header, len(sw.values), 1, wav.getframerate(), wav.getsampwidth(), wav.format)
+    return header.getvalue() + out
+
+
+def check(src: str, tmp_path, p: int = main.p, r: int = main.r):
+    want = expected(src, p, r)
+    for chunk in CHUNKS:
+        dst = str(tmp_path / f"cut-{chunk}.wav")
+        read, written = stream.clean_stream(src, dst, p, r, chunk_frames=chunk)
+        assert read == wavfile.WaveFile(src).getnframes()
+        with open(dst, "rb") as f:
+            assert f.read() == want, f"chunk_frames={chunk}"
+
+
+@pytest.mark.parametrize("src", FILES, ids=[os.path.basename(x) for x in FILES])
+def test_stream_equals_clean(src, tmp_path):
+    check(src, tmp_path)
+
+
+@pytest.mark.parametrize("format", list(synth.FORMATS))
+def test_stream_equals_clean_in_every_format(format, tmp_path):
+    src = str(tmp_path / f"gen-{format}.wav")
+    amps, freqs = synth.harmonics(5, seed=7)
+    synth.write(src, amps, freqs, 16000, 30000, format)
+    check(src, tmp_path, p=100, r=1000)
@@ -0,0 +1,59 @@
+"""
+Checks that generated waves are valid PCM (or float) files holding the sum of their
+harmonics, and that a seed always gives the same file. Run with python -m pytest.
+"""
+import wave
+import numpy as np
+import pytest
+import synth
+
+
+RATE = 8000
+# Longer than a second (the period) and not a multiple of the chunk size.
+FRAMES = 2 * RATE + synth.CHUNK_FRAMES // 3
+
+
+def reference(amps: np.ndarray, freqs: np.ndarray) -> np.ndarray:
+    t = np.arange(FRAMES) / RATE
+    return (amps[:, None] * np.sin(2 * np.pi * freqs[:, None] * t)).sum(axis=0) / amps.sum()
+
+
+@pytest.mark.parametrize("format", list(synth.FORMATS))
+def test_generated_wave_is_valid(tmp_path, format):
+    from scipy.io import wavfile as scipy_wavfile
+
+    amps, freqs = synth.harmonics(12, seed=5)
+    fpath = str(tmp_path / f"{format}.wav")
+    synth.write(fpath, amps, freqs, RATE, FRAMES, format)
+
+    rate, y = scipy_wavfile.read(fpath)
+    assert rate == RATE and y.shape == (FRAMES,) and y.dtype == np.dtype(format)
+    if format == "float32":
+        assert np.allclose(y, reference(amps, freqs), atol=1e-6)
+        assert np.abs(y).max() <= 1
+    else:
+        full = np.iinfo(format).max
+        assert np.abs(y.astype(np.int64) - reference(amps, freqs) * full).max() <= 1
+        # The stdlib reader accepts the PCM header as well.
+        with wave.open(fpath) as w:
+            assert (w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()) == \
+                (1, np.dtype(format).itemsize, RATE, FRAMES)
+            assert w.readframes(FRAMES) == y.astype(f"<{y.dtype.str[1:]}").tobytes()
+
+
+@pytest.mark.parametrize("format", list(synth.FORMATS))
+def test_seed_reproduces_wave(tmp_path, format):
+    files = []
+    for i, seed in enumerate([42, 42, 43]):
+        fpath = str(tmp_path / f"{i}.wav")
+        synth.write(fpath, *synth.harmonics(10, seed), RATE, FRAMES, format)
+        with open(fpath, "rb") as f:
+            files.append(f.read())
+    assert files[0] == files[1]
+    assert files[0] != files[2]
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        synth.write(str(tmp_path / "x.wav"), *synth.harmonics(1, 0), RATE, FRAMES, "int8")
+    assert list(tmp_path.iterdir()) == []
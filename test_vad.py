@@ -0,0 +1,49 @@
+"""
+Checks that the online detector finds the same speech as find_endpoints on the whole
+recording, whatever the chunks the stream arrives in, and never lags more than its
+lookahead. Run with python -m pytest.
+"""
+import glob
+import os
+import wave
+import numpy as np
+import pytest
+import cache
+import endpoints
+import main
+import vad
+
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+FILES = sorted(os.path.basename(x)[:-4] for x in glob.glob(os.path.join(INPUT_DIR, "*.wav")))[::5]
+# Bytes fed at once: chunks ending mid-frame (frames are 2 or 4 bytes), and the whole stream.
+CHUNKS = [1001, 4097, 65537, None]
+PARAMS = [(500, 5000), (0, 0), (2000, 20000)]
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(main, "analysis_cache", cache.Cache(enabled=False))
+
+
+@pytest.mark.parametrize("p,r", PARAMS, ids=[f"p{p}-r{r}" for p, r in PARAMS])
+@pytest.mark.parametrize("chunk", CHUNKS, ids=[f"chunk{x}" for x in CHUNKS])
+@pytest.mark.parametrize("name", FILES)
+def test_events_match_find_endpoints(name, chunk, p, r):
+    with wave.open(os.path.join(INPUT_DIR, f"{name}.wav")) as w:
+        det = vad.Detector(w.getframerate(), p, r, w.getsampwidth(), w.getnchannels())
+        raw = w.readframes(w.getnframes())
+    chunk = chunk or len(raw)
+
+    events = []
+    for i in range(0, len(raw), chunk):
+        new = det.feed(raw[i:i + chunk])
+        # Decisions come no later than the lookahead promises.
+        assert all(e.lag <= det.lookahead for e in new)
+        events += new
+    events += det.finish()
+
+    assert [e.kind for e in events] == ["start", "end"] * (len(events) // 2)
+    found = np.array([e.sample for e in events], dtype=np.int64).reshape(-1, 2)
+    sw = main.load_wave(name, directory=INPUT_DIR)
+    assert np.array_equal(found, endpoints.segments(*sw.speech_runs(p, r)).reshape(-1, 2))
@@ -0,0 +1,136 @@
+"""
+Checks the memory-mapped loader on every sample format it accepts, against files written
+by the wave module and scipy.io.wavfile, and the overflow-safe downmix. Run with
+python -m pytest.
+"""
+import struct
+import wave
+import numpy as np
+import pytest
+import wavfile
+
+
+FRAMES = 1000
+RATE = 16000
+
+
+def pcm(sampwidth: int, nchannels: int, seed: int = 0) -> np.ndarray:
+    """
+    Random (frames, channels) samples covering the full range of the sample width.
+    """
+    bits = 8 * sampwidth
+    rng = np.random.default_rng(seed)
+    x = rng.integers(-2 ** (bits - 1), 2 ** (bits - 1), size=(FRAMES, nchannels), dtype=np.int64)
+    x[0] = -2 ** (bits - 1)
+    x[1] = 2 ** (bits - 1) - 1
+    return x
+
+
+def raw(x: np.ndarray, sampwidth: int) -> bytes:
+    """
+    Little-endian PCM bytes of the samples, as the .wav format stores them.
+    """
+    if sampwidth == 1:
+        return (x + 128).astype(np.uint8).tobytes()
+    b = x.astype("<i8").view(np.uint8).reshape(x.shape + (8,))
+    return b[..., :sampwidth].tobytes()
+
+
+@pytest.mark.parametrize("nchannels", [1, 2])
+@pytest.mark.parametrize("sampwidth", [1, 2, 3, 4])
+def test_pcm_round_trip(tmp_path, sampwidth, nchannels):
+    x = pcm(sampwidth, nchannels)
+    fpath = str(tmp_path / "pcm.wav")
+    with wave.open(fpath, "wb") as w:
+        w.setnchannels(nchannels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(RATE)
+        w.writeframes(raw(x, sampwidth))
+
+    wav = wavfile.WaveFile(fpath)
+    assert (wav.getnchannels(), wav.getsampwidth(), wav.getframerate(), wav.getnframes()) == \
+        (nchannels, sampwidth, RATE, FRAMES)
+    assert np.array_equal(wav.samples(), x)
+    assert np.array_equal(wav.samples(100, 200), x[100:200])
+    for i in range(nchannels):
+        assert np.array_equal(wav.channel(i), x[:, i])
+
+
+@pytest.mark.parametrize("nchannels", [1, 2])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_float_round_trip(tmp_path, dtype, nchannels):
+    from scipy.io import wavfile as scipy_wavfile
+
+    x = np.random.default_rng(1).uniform(-1, 1, size=(FRAMES, nchannels)).astype(dtype)
+    fpath = str(tmp_path / "float.wav")
+    scipy_wavfile.write(fpath, RATE, x if nchannels > 1 else x[:, 0])
+
+    wav = wavfile.WaveFile(fpath)
+    assert wav.format == wavfile.WAVE_FORMAT_IEEE_FLOAT
+    assert wav.samples().dtype == dtype
+    assert np.array_equal(wav.samples(), x)
+    assert np.array_equal(np.asarray(wav.mono()), wavfile.downmix(x))
+
+
+def extensible(fpath: str, data: bytes, nchannels: int, sampwidth: int, subformat: int):
+    """
+    Writes a WAVE_FORMAT_EXTENSIBLE file, with an odd-sized chunk before the data.
+    """
+    guid = struct.pack("<H", subformat) + b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+    fmt = struct.pack("<HHIIHHHHI", wavfile.WAVE_FORMAT_EXTENSIBLE, nchannels, RATE,
+                      RATE * nchannels * sampwidth, nchannels * sampwidth, 8 * sampwidth,
+                      22, 8 * sampwidth, 0) + guid
+    junk = b"odd"
+    chunks = (b"fmt " + struct.pack("<I", len(fmt)) + fmt
+              + b"LIST" + struct.pack("<I", len(junk)) + junk + b"\x00"
+              + b"data" + struct.pack("<I", len(data)) + data)
+    with open(fpath, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+
+
+def test_extensible_pcm(tmp_path):
+    x = pcm(3, 2, seed=2)
+    fpath = str(tmp_path / "ext-pcm.wav")
+    extensible(fpath, raw(x, 3), 2, 3, wavfile.WAVE_FORMAT_PCM)
+    wav = wavfile.WaveFile(fpath)
+    assert (wav.format, wav.getsampwidth(), wav.getnframes()) == (wavfile.WAVE_FORMAT_PCM, 3, FRAMES)
+    assert np.array_equal(wav.samples(), x)
+
+
+def test_extensible_float(tmp_path):
+    x = np.random.default_rng(3).uniform(-1, 1, size=(FRAMES, 2)).astype("<f4")
+    fpath = str(tmp_path / "ext-float.wav")
+    extensible(fpath, x.tobytes(), 2, 4, wavfile.WAVE_FORMAT_IEEE_FLOAT)
+    wav = wavfile.WaveFile(fpath)
+    assert wav.format == wavfile.WAVE_FORMAT_IEEE_FLOAT
+    assert np.array_equal(wav.samples(), x)
+
+
+def test_unsupported_format(tmp_path):
+    fpath = str(tmp_path / "alaw.wav")
+    extensible(fpath, b"\x00" * 4, 2, 1, 0x0006)
+    with pytest.raises(ValueError):
+        wavfile.WaveFile(fpath)
+
+
+@pytest.mark.parametrize("sampwidth", [2, 4])
+def test_downmix_does_not_overflow(tmp_path, sampwidth):
+    dtype = np.int16 if sampwidth == 2 else np.int32
+    info = np.iinfo(dtype)
+    x = np.array([[info.max, info.max], [info.min, info.min], [info.max, info.min],
+                  [info.max, info.max - 1]], dtype=dtype)
+    assert np.array_equal(wavfile.downmix(x), [info.max, info.min, -1, info.max - 1])
+
+    x = pcm(sampwidth, 2, seed=4)
+    fpath = str(tmp_path / "stereo.wav")
+    with wave.open(fpath, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(sampwidth)
+        w.setframerate(RATE)
+        w.writeframes(raw(x, sampwidth))
+    # Floor of the exact average, lazily or all at once.
+    mono = wavfile.WaveFile(fpath).mono()
+    expected = x.sum(axis=1) // 2
+    assert np.array_equal(np.asarray(mono), expected)
+    assert np.array_equal(mono[250:750], expected[250:750])
+    assert np.asarray(mono).dtype == dtype
@@ -0,0 +1,255 @@
+"""
+Online voice activity detection on live PCM streams. Reads raw frames from stdin, a file or
+named pipe, or a localhost TCP connection, and prints a JSON line for every start and end of
+speech as soon as it's final. Decisions equal those of SoundWave.find_endpoints on the whole
+recording, but are never more than P + R samples (plus a detection window) behind the stream.
+
+    arecord -f S16_LE -r 44100 -c 1 | python vad.py --rate 44100
+    python vad.py --wav < input/male-alpha.wav
+    python vad.py --source tcp:9000 --rate 16000 --channels 2
+"""
+from collections import deque
+from typing import List
+import argparse
+import json
+import socket
+import sys
+import time
+import wave
+import numpy as np
+import endpoints
+import wavfile
+
+
+# Bytes read from the source at once.
+READ_BYTES = 1 << 12
+# Number of per-frame processing times kept for the latency report.
+LATENCY_WINDOW = 10000
+
+
+class RingBuffer:
+    """
+    Fixed-capacity FIFO of samples in a preallocated array. Memory doesn't grow with the
+    length of the stream.
+    """
+
+    def __init__(self, capacity: int, dtype):
+        self.buf = np.zeros(capacity, dtype=dtype)
+        self.start = 0
+        self.size = 0
+
+    @property
+    def free(self) -> int:
+        return len(self.buf) - self.size
+
+    def write(self, values: np.ndarray):
+        if len(values) > self.free:
+            raise ValueError("Ring buffer overflow")
+        end = (self.start + self.size) % len(self.buf)
+        first = min(len(values), len(self.buf) - end)
+        self.buf[end:end + first] = values[:first]
+        self.buf[:len(values) - first] = values[first:]
+        self.size += len(values)
+
+    def read(self, n: int) -> np.ndarray:
+        """
+        Removes the first n samples. Returns a view when they don't wrap around, else a copy.
+        """
+        n = min(n, self.size)
+        if self.start + n <= len(self.buf):
+            out = self.buf[self.start:self.start + n]
+        else:
+            out = np.concatenate((self.buf[self.start:], self.buf[:self.start + n - len(self.buf)]))
+        self.start = (self.start + n) % len(self.buf)
+        self.size -= n
+        return out
+
+
+class Event:
+    """
+    Start or end of speech. sample is the position of the first sample of speech (or the first
+    one after it), lag how far the stream had already been read past it when it was decided.
+    """
+
+    def __init__(self, kind: str, sample: int, framerate: int, lag: int):
+        self.kind = kind
+        self.sample = sample
+        self.time = sample / framerate
+        self.lag = lag / framerate
+
+    def to_dict(self) -> dict:
+        return {"event": self.kind, "sample": self.sample, "time": round(self.time, 6),
+                "lag_ms": round(self.lag * 1000, 3)}
+
+
+class Detector:
+    """
+    Incremental find_endpoints. The noise limit is estimated from the first INITIAL_T ms of
+    the stream, then every full detection window is classified and passed through the
+    hangover filter as soon as it arrives.
+    """
+
+    def __init__(self, framerate: int, p: int, r: int, sampwidth: int = 2, nchannels: int = 1):
+        self.framerate = framerate
+        self.sampwidth = sampwidth
+        self.nchannels = nchannels
+        self.window_w = endpoints.window_width(framerate)
+        self.initial_t = round(framerate * endpoints.INITIAL_T / 1000)
+        self.hangover = endpoints.HangoverFilter(p, r)
+        self.ring = RingBuffer(max(self.window_w, self.initial_t), np.float64)
+        self.noise_l = None
+        self.partial = b""
+        self.read = 0
+        self.decided = 0
+        self.speech = False
+        # Processing time (s) of each detection window.
+        self.timings = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def lookahead(self) -> float:
+        """
+        Longest time (s) a decision can lag behind the stream.
+        """
+        hangover = sum(stage.limit for stage in self.hangover.stages)
+        return (hangover + max(self.window_w, self.initial_t)) / self.framerate
+
+    def feed(self, raw: bytes) -> List[Event]:
+        """
+        Consumes raw PCM bytes, which may end in the middle of a frame. Returns the events
+        that became final.
+        """
+        frame = self.sampwidth * self.nchannels
+        raw = self.partial + raw
+        whole = len(raw) // frame * frame
+        self.partial = raw[whole:]
+        vals = wavfile.downmix(wavfile.decode_bytes(raw[:whole], self.sampwidth, self.nchannels))
+        return self.push(vals)
+
+    def push(self, vals: np.ndarray) -> List[Event]:
+        """
+        Consumes decoded mono samples. Returns the events that became final.
+        """
+        events = []
+        while len(vals) > 0:
+            take = min(len(vals), self.ring.free)
+            self.ring.write(vals[:take])
+            self.read += take
+            vals = vals[take:]
+            if self.noise_l is None and self.ring.size >= self.initial_t:
+                self.noise_l = endpoints.noise_limit(self.ring.buf[:self.ring.size], self.framerate)
+            while self.noise_l is not None and self.ring.size >= self.window_w:
+                events += self._window(self.ring.read(self.window_w))
+        return events
+
+    def finish(self) -> List[Event]:
+        """
+        Ends the stream: classifies the last, possibly shorter window and flushes the filter.
+        """
+        events = []
+        if self.ring.size > 0:
+            if self.noise_l is None:
+                self.noise_l = endpoints.noise_limit(self.ring.buf[:self.ring.size], self.framerate)
+            events += self._window(self.ring.read(self.ring.size))
+        events += self._decide(self.hangover.finish())
+        if self.speech:
+            events.append(Event("end", self.decided, self.framerate, self.read - self.decided))
+            self.speech = False
+        return events
+
+    def _window(self, vals: np.ndarray) -> List[Event]:
+        start = time.perf_counter()
+        flag = np.absolute(vals).mean() > self.noise_l
+        events = self._decide(self.hangover.push(bool(flag), len(vals)))
+        self.timings.append(time.perf_counter() - start)
+        return events
+
+    def _decide(self, runs) -> List[Event]:
+        events = []
+        for speech, length in runs:
+            if speech != self.speech:
+                kind = "start" if speech else "end"
+                events.append(Event(kind, self.decided, self.framerate, self.read - self.decided))
+                self.speech = speech
+            self.decided += length
+        return events
+
+    def latency(self) -> dict:
+        """
+        Per-window processing time percentiles (ms) and the real-time factor: how many
+        times faster than real time windows are processed.
+        """
+        if len(self.timings) == 0:
+            return {}
+        t = np.array(self.timings)
+        window_s = self.window_w / self.framerate
+        return {"frames": len(t), "p50_ms": np.percentile(t, 50) * 1000,
+                "p99_ms": np.percentile(t, 99) * 1000, "max_ms": t.max() * 1000,
+                "realtime_factor": window_s / max(np.percentile(t, 99), 1e-9)}
+
+
+def chunks(source: str):
+    """
+    Yields raw bytes from stdin ("-"), a file or named pipe, or a single TCP sender
+    connecting to localhost ("tcp:PORT"), as they arrive.
+    """
+    if source.startswith("tcp:"):
+        with socket.create_server(("127.0.0.1", int(source[4:]))) as srv:
+            conn, _ = srv.accept()
+            with conn:
+                while True:
+                    data = conn.recv(READ_BYTES)
+                    if not data:
+                        return
+                    yield data
+    f = sys.stdin.buffer if source == "-" else open(source, "rb")
+    try:
+        while True:
+            data = f.read1(READ_BYTES)
+            if not data:
+                return
+            yield data
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+def main_vad(argv=None):
+    parser = argparse.ArgumentParser(description="Online voice activity detection on a PCM stream.")
+    parser.add_argument("--source", default="-", help="-, a file or named pipe, or tcp:PORT (default stdin)")
+    parser.add_argument("--wav", action="store_true", help="the stream starts with a .wav header")
+    parser.add_argument("--rate", type=int, default=44100, help="frame rate of raw PCM (default 44100)")
+    parser.add_argument("--channels", type=int, default=1, help="channels of raw PCM (default 1)")
+    parser.add_argument("--width", type=int, default=2, help="bytes per sample of raw PCM (default 2)")
+    parser.add_argument("-p", type=int, default=500, help="P parameter (default 500)")
+    parser.add_argument("-r", type=int, default=5000, help="R parameter (default 5000)")
+    args = parser.parse_args(argv)
+
+    if args.wav:
+        src = sys.stdin.buffer if args.source == "-" else open(args.source, "rb")
+        wav = wave.open(src, "rb")
+        detector = Detector(wav.getframerate(), args.p, args.r, wav.getsampwidth(), wav.getnchannels())
+        frames = max(1, READ_BYTES // (detector.sampwidth * detector.nchannels))
+        stream = iter(lambda: wav.readframes(frames), b"")
+    else:
+        detector = Detector(args.rate, args.p, args.r, args.width, args.channels)
+        stream = chunks(args.source)
+
+    print(f"🎙️  Listening, decisions lag at most {detector.lookahead * 1000:.0f} ms", file=sys.stderr)
+    try:
+        for raw in stream:
+            for e in detector.feed(raw):
+                print(json.dumps(e.to_dict()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    for e in detector.finish():
+        print(json.dumps(e.to_dict()), flush=True)
+
+    lat = detector.latency()
+    if lat:
+        print(f"⏱️  {lat['frames']} frames, p50 {lat['p50_ms']:.3f} ms, p99 {lat['p99_ms']:.3f} ms, "
+              f"max {lat['max_ms']:.3f} ms, {lat['realtime_factor']:.0f}x real time", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_vad())
@@ -0,0 +1,249 @@
+import struct
+import numpy as np
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Number of frames decoded at once when a whole wave is downmixed.
+DOWNMIX_CHUNK = 1 << 18
+
+
+class WaveFile:
+    """
+    Memory-mapped .wav file. Parses the RIFF header and exposes the data chunk as an
+    np.memmap, so samples are only read from disk once they're touched. The file isn't even
+    mapped until the first access to frames. Offers the same
+    getters as wave.Wave_read, so it can be used in its place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = None
+        self.nchannels = None
+        self.framerate = None
+        self.sampwidth = None
+        self.offset = None
+        self.nframes = None
+
+        with open(path, "rb") as f:
+            header = f.read(12)
+            if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != b"WAVE":
+                raise ValueError(f"Not a RIFF/WAVE file: {path}")
+
+            while self.offset is None:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"No data chunk found in {path}")
+                chunk_id, size = struct.unpack("<4sI", header)
+
+                if chunk_id == b"fmt ":
+                    fmt = f.read(size)
+                    self.format, self.nchannels, self.framerate, _, block_align, bits = \
+                        struct.unpack("<HHIIHH", fmt[:16])
+                    if self.format == WAVE_FORMAT_EXTENSIBLE:
+                        self.format = struct.unpack("<H", fmt[24:26])[0]
+                    self.sampwidth = block_align // self.nchannels
+                elif chunk_id == b"data":
+                    if self.format is None:
+                        raise ValueError(f"Data chunk comes before fmt chunk in {path}")
+                    self.offset = f.tell()
+                    self.nframes = size // (self.sampwidth * self.nchannels)
+                else:
+                    f.seek(size, 1)
+
+                # Chunks are padded to an even number of bytes.
+                if chunk_id != b"data" and size % 2 == 1:
+                    f.seek(1, 1)
+
+        if self.format == WAVE_FORMAT_PCM and self.sampwidth in [1, 2, 3, 4]:
+            self.dtype = np.dtype([np.int16, np.int16, np.int32, np.int32][self.sampwidth - 1])
+            raw = ["u1", "<i2", "u1", "<i4"][self.sampwidth - 1]
+        elif self.format == WAVE_FORMAT_IEEE_FLOAT and self.sampwidth in [4, 8]:
+            self.dtype = np.dtype(np.float32 if self.sampwidth == 4 else np.float64)
+            raw = "<f4" if self.sampwidth == 4 else "<f8"
+        else:
+            raise ValueError(
+                f"Unsupported sample format {self.format} ({self.sampwidth * 8} bit) in {path}")
+
+        self.raw = np.dtype(raw)
+        self._frames = None
+
+    @property
+    def frames(self) -> np.ndarray:
+        """
+        Raw frames of the data chunk, (frames, channels) or (frames, channels, 3) for 24-bit.
+        """
+        if self._frames is None:
+            shape = (self.nframes, self.nchannels)
+            if self.sampwidth == 3:
+                shape += (3,)
+            if self.nframes == 0:
+                self._frames = np.zeros(shape, dtype=self.raw)
+            else:
+                self._frames = np.memmap(
+                    self.path, dtype=self.raw, mode="r", offset=self.offset, shape=shape)
+        return self._frames
+
+    def getnchannels(self) -> int:
+        return self.nchannels
+
+    def getsampwidth(self) -> int:
+        return self.sampwidth
+
+    def getframerate(self) -> int:
+        return self.framerate
+
+    def getnframes(self) -> int:
+        return self.nframes
+
+    def samples(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        Returns frames [start, stop) as a 2-D (frames, channels) array. 16-bit, 32-bit and
+        float waves are returned as views of the file, 8-bit and 24-bit waves are decoded.
+        """
+        return decode(self.frames[start:stop], self.sampwidth, self.format)
+
+    def channel(self, i: int) -> np.ndarray:
+        """
+        Returns the samples of the i-th channel. A strided view for 16-bit, 32-bit and float waves.
+        """
+        if self.sampwidth in [1, 3]:
+            return decode(self.frames[:, i:i + 1], self.sampwidth, self.format)[:, 0]
+        return self.frames[:, i]
+
+    def mono(self):
+        """
+        Returns the (lazy) samples of a mono wave as is, otherwise a lazy downmix of all channels.
+        """
+        if self.nchannels == 1:
+            return Channel(self, 0)
+        return Downmix(self)
+
+
+class Channel:
+    """
+    Lazy single channel of a WaveFile. Indexing only decodes the frames it touches, and the
+    whole channel is only mapped once it's converted to an array.
+    """
+
+    def __init__(self, wf: WaveFile, i: int):
+        self.wf = wf
+        self.i = i
+        self.dtype = wf.dtype
+        self.shape = (wf.nframes,)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return self.wf.samples(start, stop)[::step, self.i]
+        if key < 0:
+            key += len(self)
+        return self[key:key + 1][0]
+
+    def __array__(self, dtype=None, copy=None):
+        out = self.wf.channel(self.i)
+        return out if dtype is None else out.astype(dtype)
+
+
+class Downmix:
+    """
+    Lazy average of all channels of a WaveFile. Only the frames that are indexed get decoded
+    and averaged. Channels are summed in a wider type, so the average can't overflow.
+    """
+
+    def __init__(self, wf: WaveFile):
+        self.wf = wf
+        self.dtype = wf.dtype
+        self.shape = (wf.nframes,)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            return downmix(self.wf.samples(start, stop))[::step]
+        if key < 0:
+            key += len(self)
+        return self[key:key + 1][0]
+
+    def __array__(self, dtype=None, copy=None):
+        out = np.empty(self.shape, dtype=self.dtype)
+        for i in range(0, len(self), DOWNMIX_CHUNK):
+            out[i:i + DOWNMIX_CHUNK] = self[i:i + DOWNMIX_CHUNK]
+        return out if dtype is None else out.astype(dtype)
+
+
+def decode(frames: np.ndarray, sampwidth: int, format: int = WAVE_FORMAT_PCM) -> np.ndarray:
+    """
+    Converts raw frames into signed samples. 8-bit (unsigned) samples become int16, 24-bit
+    samples become int32. Other formats are returned as they are.
+    """
+    if format == WAVE_FORMAT_PCM and sampwidth == 1:
+        return frames.astype(np.int16) - 128
+    if format == WAVE_FORMAT_PCM and sampwidth == 3:
+        b = frames.astype(np.int32)
+        vals = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+        # Sign extension.
+        return (vals << 8) >> 8
+    return frames
+
+
+def encode(samples: np.ndarray, sampwidth: int, format: int = WAVE_FORMAT_PCM) -> bytes:
+    """
+    Inverse of decode. Converts samples into raw bytes of the given sample width and format.
+    """
+    if format == WAVE_FORMAT_IEEE_FLOAT:
+        return samples.astype(f"<f{sampwidth}").tobytes()
+    if sampwidth == 1:
+        return (samples + 128).astype(np.uint8).tobytes()
+    if sampwidth == 3:
+        b = samples.astype("<i4").view(np.uint8).reshape(samples.shape + (4,))
+        return b[..., :3].tobytes()
+    return samples.astype(["<i2", "<i4"][sampwidth // 2 - 1]).tobytes()
+
+
+def write_header(f, nframes: int, nchannels: int, framerate: int, sampwidth: int,
+                 format: int = WAVE_FORMAT_PCM):
+    """
+    Writes the RIFF header of a .wav with nframes frames to the binary file f, up to the start
+    of the sample data. Float waves also get the fact chunk non-PCM formats require.
+    """
+    size = nframes * nchannels * sampwidth
+    fmt = struct.pack("<HHIIHH", format, nchannels, framerate, framerate * nchannels * sampwidth,
+                      nchannels * sampwidth, sampwidth * 8)
+    fact = b""
+    if format != WAVE_FORMAT_PCM:
+        fmt += struct.pack("<H", 0)
+        fact = struct.pack("<4sII", b"fact", 4, nframes)
+    riff = 4 + 8 + len(fmt) + len(fact) + 8 + size
+    f.write(struct.pack("<4sI4s", b"RIFF", riff, b"WAVE"))
+    f.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt + fact)
+    f.write(struct.pack("<4sI", b"data", size))
+
+
+def decode_bytes(raw: bytes, sampwidth: int, nchannels: int) -> np.ndarray:
+    """
+    Decodes PCM frames read through wave.Wave_read into a 2-D (frames, channels) array.
+    """
+    dtype = ["u1", "<i2", "u1", "<i4"][sampwidth - 1]
+    frames = np.frombuffer(raw, dtype)
+    shape = (-1, nchannels, 3) if sampwidth == 3 else (-1, nchannels)
+    return decode(frames.reshape(shape), sampwidth)
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """
+    Averages the channels of 2-D (frames, channels) samples, keeping their type. Integer
+    samples are floor-divided, as before, but summed in 64 bits so they can't overflow.
+    """
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    if np.issubdtype(samples.dtype, np.integer):
+        return (samples.sum(axis=1, dtype=np.int64) // samples.shape[1]).astype(samples.dtype)
+    return samples.mean(axis=1, dtype=np.float64).astype(samples.dtype)